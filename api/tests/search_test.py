@@ -0,0 +1,92 @@
+import json
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.views import SEARCH_PAGE_SIZE_MAX
+from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.tests.conftest import create_email
+
+FROM_LINKEDIN = {
+    "field": "from",
+    "predicate": "contains",
+    "value": "linkedin",
+    "type": "string",
+}
+
+
+def ndjson(response) -> list[dict]:
+    body = b"".join(response.streaming_content).decode()
+    return [json.loads(line) for line in body.splitlines()]
+
+
+@pytest.mark.django_db
+class TestSearchEmailsAPI:
+    ENDPOINT = reverse("search-emails")
+
+    @pytest.fixture(autouse=True)
+    def setup_emails(self) -> None:
+        for day in range(5):
+            create_email(f"l{day}", "LinkedIn <jobs@linkedin.com>", f"job {day}", day)
+        create_email("other", "someone@example.com", "hello")
+
+    def search(self, payload: dict):
+        return APIClient().post(self.ENDPOINT, payload, format="json")
+
+    def test_streams_matching_emails_newest_first(self) -> None:
+        response = self.search({"condition": FROM_LINKEDIN, "page_size": 2})
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/x-ndjson"
+        rows = ndjson(response)
+        assert [row["msg_id"] for row in rows] == ["l0", "l1", "l2", "l3", "l4"]
+        assert "message" not in rows[0]
+
+    def test_projection_and_cursor(self) -> None:
+        payload = {
+            "type": "any",
+            "conditions": [FROM_LINKEDIN],
+            "fields": ["msg_id"],
+            "limit": 2,
+            "page_size": 1,
+        }
+        rows = ndjson(self.search(payload))
+        assert rows[:2] == [{"msg_id": "l0"}, {"msg_id": "l1"}]
+
+        payload["cursor"] = rows[2]["next_cursor"]
+        payload["limit"] = None
+        rows = ndjson(self.search(payload))
+        assert [row["msg_id"] for row in rows] == ["l2", "l3", "l4"]
+
+    @pytest.mark.parametrize(
+        "page_size, expected", [(10**9, SEARCH_PAGE_SIZE_MAX), (0, 1), (2, 2)]
+    )
+    def test_page_size_is_clamped(self, monkeypatch, page_size, expected) -> None:
+        page_sizes = []
+        stream = DBSearchEngine.stream
+
+        def spy(self, rule, fields, page_size, after=None):
+            page_sizes.append(page_size)
+            return stream(self, rule, fields, page_size, after)
+
+        monkeypatch.setattr(DBSearchEngine, "stream", spy)
+        rows = ndjson(self.search({"condition": FROM_LINKEDIN, "page_size": page_size}))
+        assert len(rows) == 5
+        assert page_sizes == [expected]
+
+    @pytest.mark.parametrize(
+        "payload",
+        [
+            {"condition": {**FROM_LINKEDIN, "field": "bcc"}},
+            {"condition": FROM_LINKEDIN, "fields": ["password"]},
+            {"conditions": [FROM_LINKEDIN], "cursor": "yesterday"},
+            {"conditions": [FROM_LINKEDIN], "cursor": 5},
+            {"conditions": [FROM_LINKEDIN], "cursor": ["2024-01-01", 1]},
+            {"conditions": [FROM_LINKEDIN], "limit": 0},
+            {"conditions": [FROM_LINKEDIN], "limit": -1},
+            {"conditions": [FROM_LINKEDIN], "limit": "many"},
+            {},
+        ],
+    )
+    def test_invalid_search(self, payload) -> None:
+        assert self.search(payload).status_code == 400
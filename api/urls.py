@@ -5,4 +5,5 @@ from api import views
 urlpatterns = [
     path("ping/", views.ping, name="ping"),
     path("email/process/", views.process_email, name="process-email"),
+    path("emails/search/", views.search_emails, name="search-emails"),
 ]
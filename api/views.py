@@ -1,7 +1,11 @@
 import json
+from dataclasses import asdict
+from datetime import datetime
 
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import FileExtensionValidator
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
@@ -9,8 +13,32 @@ from rest_framework.response import Response
 
 from core.models import Email
 from core.processor.email_processor import GmailProcessor
-from core.processor.process_executor.gmail_executor import GmailProcessExecutor
+from core.processor.exception import ConditionError, ConditionTypeError, RuleTypeError
+from core.processor.rule import Rule
+from core.processor.search_engine.cache import CachedSearchEngine
 from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.registry import get_backend
+
+SEARCH_FIELDS = [
+    "msg_id",
+    "from_email",
+    "sender_name",
+    "sender_address",
+    "sender_domain",
+    "subject",
+    "received_at",
+    "thread_id",
+    "to_addresses",
+    "cc_addresses",
+    "size_estimate",
+    "attachment_count",
+    "attachment_bytes",
+    "label_bits",
+    "message",
+]
+DEFAULT_SEARCH_FIELDS = [field for field in SEARCH_FIELDS if field != "message"]
+SEARCH_PAGE_SIZE = 500
+SEARCH_PAGE_SIZE_MAX = 5000
 
 
 @api_view(["GET"])
@@ -31,12 +59,70 @@ def process_email(request: Request) -> Response:
             rules = [rules]
 
         process = GmailProcessor()
-        search_engine = DBSearchEngine(Email)
-        process_executor = GmailProcessExecutor()
+        search_engine = CachedSearchEngine(get_backend("search_engine")(Email))
+        process_executor = get_backend("executor")()
         for rule in rules:
             process.add(rule)
 
-        process.execute(search_engine=search_engine, executor=process_executor)
-        return Response({"detail": "completed"})
+        report = process.execute(search_engine=search_engine, executor=process_executor)
+        return Response(
+            {
+                "detail": "completed",
+                "optimizer": report.as_dict(),
+                "execution": asdict(process.execution_report),
+            }
+        )
     except ValidationError:
         return Response({"detail": "invalid file type"})
+
+
+@api_view(["POST"])
+def search_emails(request: Request) -> Response | StreamingHttpResponse:
+    data = request.data
+    fields = data.get("fields") or DEFAULT_SEARCH_FIELDS
+    if not isinstance(fields, list) or not set(fields) <= set(SEARCH_FIELDS):
+        return Response(
+            {"detail": f"fields must be a subset of {SEARCH_FIELDS}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        conditions = data["conditions"] if "conditions" in data else [data["condition"]]
+        rule = Rule(data.get("type", "all"), conditions)
+        limit = int(data["limit"]) if data.get("limit") is not None else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be positive")
+        page_size = int(data.get("page_size", SEARCH_PAGE_SIZE))
+        page_size = min(max(page_size, 1), SEARCH_PAGE_SIZE_MAX)
+        after = None
+        if data.get("cursor"):
+            if not isinstance(data["cursor"], str):
+                raise TypeError("cursor must be a string")
+            received_at, pk = data["cursor"].rsplit(",", 1)
+            after = (datetime.fromisoformat(received_at), int(pk))
+    except (ConditionError, ConditionTypeError, RuleTypeError) as error:
+        return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {"detail": "invalid search"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # keyset pages are read from the local store whatever the rule backend
+    search_engine = DBSearchEngine(Email)
+    rows = search_engine.stream(rule, fields, page_size=page_size, after=after)
+    return StreamingHttpResponse(
+        _ndjson(rows, fields, limit), content_type="application/x-ndjson"
+    )
+
+
+def _ndjson(rows, fields: list[str], limit: int | None):
+    encoder = DjangoJSONEncoder()
+    count = 0
+    last = None
+    for row in rows:
+        if limit is not None and count == limit:
+            cursor = f"{last['received_at'].isoformat()},{last['id']}"
+            yield encoder.encode({"next_cursor": cursor}) + "\n"
+            return
+        yield encoder.encode({field: row[field] for field in fields}) + "\n"
+        count += 1
+        last = row
@@ -0,0 +1,61 @@
+import re
+from email.utils import parseaddr
+
+MULTI_LABEL_SUFFIXES = {
+    "ac.in",
+    "ac.jp",
+    "ac.uk",
+    "co.in",
+    "co.jp",
+    "co.kr",
+    "co.nz",
+    "co.uk",
+    "co.za",
+    "com.au",
+    "com.br",
+    "com.cn",
+    "com.mx",
+    "com.sg",
+    "gov.in",
+    "gov.uk",
+    "net.au",
+    "org.au",
+    "org.in",
+    "org.uk",
+}
+
+ADDRESS_PATTERN = re.compile(r"^[^\s@<>]+@[a-z0-9-]+(\.[a-z0-9-]+)+$")
+DOMAIN_PATTERN = re.compile(r"^@?[a-z0-9-]+(\.[a-z0-9-]+)+$")
+
+
+def registrable_domain(host: str) -> str:
+    host = host.strip().strip(".").lower()
+    labels = host.split(".")
+    if len(labels) <= 2:
+        return host
+    if ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def parse_sender(header: str | None) -> tuple[str, str, str]:
+    if not header:
+        return "", "", ""
+    name, address = parseaddr(header)
+    address = address.strip().lower()
+    if "@" not in address:
+        return name.strip(), "", ""
+    domain = registrable_domain(address.rsplit("@", 1)[1])
+    return name.strip(), address, domain
+
+
+def is_address(value: str) -> bool:
+    return ADDRESS_PATTERN.match(value.strip().lower()) is not None
+
+
+def is_registrable_domain(value: str) -> bool:
+    value = value.strip().lower()
+    if DOMAIN_PATTERN.match(value) is None:
+        return False
+    host = value.lstrip("@")
+    return registrable_domain(host) == host
@@ -0,0 +1,85 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import get_commands
+from django.core.management.base import BaseCommand
+
+SETUP_CODE = (
+    "import os, django;"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'email_op.settings');"
+    "django.setup();"
+)
+PROJECT_APPS = ["api", "core", "loader"]
+HEAVY_PACKAGES = ["googleapiclient", "google_auth_oauthlib", "dateutil"]
+
+
+class Command(BaseCommand):
+    help = "Measure cold start import cost of each project command"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--json", action="store_true", help="Print a JSON report")
+
+    def handle(self, *args, **options):
+        targets = {"django.setup": "", "api": "import email_op.urls"}
+        for name, app in sorted(get_commands().items()):
+            if app in PROJECT_APPS:
+                # command modules may be named after keywords, like import
+                targets[name] = (
+                    "import importlib;"
+                    f"importlib.import_module('{app}.management.commands.{name}')"
+                )
+
+        report = {
+            name: self._measure(code, options["runs"]) for name, code in targets.items()
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'target':<20}{'wall ms':>10}{'import ms':>12}{'modules':>10}  heavy"
+        )
+        for name, result in report.items():
+            self.stdout.write(
+                f"{name:<20}{result['wall_ms']:>10.1f}{result['import_ms']:>12.1f}"
+                f"{result['modules']:>10}  {','.join(result['heavy']) or '-'}"
+            )
+
+    def _measure(self, code: str, runs: int) -> dict:
+        walls, imports = [], []
+        modules, heavy = 0, set()
+        for _ in range(runs):
+            start = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", SETUP_CODE + code],
+                cwd=settings.BASE_DIR,
+                env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            walls.append((time.perf_counter() - start) * 1000)
+
+            total, modules = 0, 0
+            for line in completed.stderr.splitlines():
+                if not line.startswith("import time:") or "self [us]" in line:
+                    continue
+                self_us, _, module = line[len("import time:") :].split("|")
+                total += int(self_us)
+                modules += 1
+                package = module.strip().split(".")[0]
+                if package in HEAVY_PACKAGES:
+                    heavy.add(package)
+            imports.append(total / 1000)
+        return {
+            "wall_ms": statistics.median(walls),
+            "import_ms": statistics.median(imports),
+            "modules": modules,
+            "heavy": sorted(heavy),
+        }
@@ -4,8 +4,9 @@ from django.core.management.base import BaseCommand
 
 from core.models import Email
 from core.processor.email_processor import GmailProcessor
-from core.processor.process_executor.gmail_executor import GmailProcessExecutor
-from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.processor.search_engine.cache import CachedSearchEngine
+from core.profiling import add_profile_arguments, profile_command
+from core.registry import get_backend
 
 
 class Command(BaseCommand):
@@ -15,19 +16,49 @@ class Command(BaseCommand):
         parser.add_argument(
             "file", type=str, help="Path To Organization Configuration File"
         )
+        parser.add_argument("--search-engine", help="Registered search engine name")
+        parser.add_argument("--executor", help="Registered executor name")
+        parser.add_argument(
+            "--workers", type=int, help="Batches the executor sends concurrently"
+        )
+        add_profile_arguments(parser)
 
     def handle(self, *args, **options):
+        with profile_command(options, self.stdout):
+            self._process(options)
+
+    def _process(self, options):
         try:
             rule_file = options["file"]
             with open(rule_file) as fp:
                 rules = json.load(fp)
             process = GmailProcessor()
-            search_engine = DBSearchEngine(Email)
-            process_executor = GmailProcessExecutor()
+            search_engine = CachedSearchEngine(
+                get_backend("search_engine", options["search_engine"])(Email)
+            )
+            executor_options = {}
+            if options["workers"]:
+                executor_options["workers"] = options["workers"]
+            process_executor = get_backend("executor", options["executor"])(
+                **executor_options
+            )
             for rule in rules:
                 process.add(rule)
 
-            process.execute(search_engine=search_engine, executor=process_executor)
+            report = process.execute(
+                search_engine=search_engine, executor=process_executor
+            )
+            self.stdout.write(
+                f"Evaluated {report.evaluations} of {report.conditions} conditions "
+                f"({report.evaluations_saved} saved), "
+                f"collapsed {report.collapsed_rules} duplicate rule(s), "
+                f"streamed {report.streamed_rules} rule(s)"
+            )
+            execution = process.execution_report
+            self.stdout.write(
+                f"Sent {execution.sent} changes ({execution.failed} failed), "
+                f"thread modifies saved {execution.calls_saved} call(s)"
+            )
             self.stdout.write(self.style.SUCCESS("All the operation ran successfully"))
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f"File {rule_file} does not exist"))
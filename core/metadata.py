@@ -0,0 +1,61 @@
+from email.utils import getaddresses
+from typing import Iterable, Optional
+
+# bit i of Email.label_bits is set when the message has SYSTEM_LABELS[i];
+# append new labels at the end, stored bitmaps depend on the order
+SYSTEM_LABELS = [
+    "INBOX",
+    "UNREAD",
+    "STARRED",
+    "IMPORTANT",
+    "SENT",
+    "DRAFT",
+    "SPAM",
+    "TRASH",
+    "CATEGORY_PERSONAL",
+    "CATEGORY_SOCIAL",
+    "CATEGORY_PROMOTIONS",
+    "CATEGORY_UPDATES",
+    "CATEGORY_FORUMS",
+]
+LABEL_BITS = {label: 1 << bit for bit, label in enumerate(SYSTEM_LABELS)}
+# Takeout mbox files name the labels in X-Gmail-Labels
+TAKEOUT_LABELS = {
+    "inbox": "INBOX",
+    "unread": "UNREAD",
+    "starred": "STARRED",
+    "important": "IMPORTANT",
+    "sent": "SENT",
+    "drafts": "DRAFT",
+    "draft": "DRAFT",
+    "spam": "SPAM",
+    "trash": "TRASH",
+    "category personal": "CATEGORY_PERSONAL",
+    "category social": "CATEGORY_SOCIAL",
+    "category promotions": "CATEGORY_PROMOTIONS",
+    "category updates": "CATEGORY_UPDATES",
+    "category forums": "CATEGORY_FORUMS",
+}
+
+
+def label_mask(label: str) -> Optional[int]:
+    return LABEL_BITS.get(label.strip().upper())
+
+
+def label_bits(label_ids: Iterable[str]) -> int:
+    # user labels have no fixed bit and are not stored
+    bits = 0
+    for label in label_ids:
+        bits |= LABEL_BITS.get(label, 0)
+    return bits
+
+
+def takeout_label_ids(header: Optional[str]) -> list[str]:
+    labels = (label.strip().lower() for label in (header or "").split(","))
+    return [TAKEOUT_LABELS[label] for label in labels if label in TAKEOUT_LABELS]
+
+
+def address_list(header: Optional[str]) -> str:
+    """Lowercased addresses of a To or Cc header, comma separated."""
+    addresses = (address.strip().lower() for _, address in getaddresses([header or ""]))
+    return ",".join(dict.fromkeys(address for address in addresses if "@" in address))
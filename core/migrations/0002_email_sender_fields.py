@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+from core.address import parse_sender
+
+
+def populate_sender_fields(apps, schema_editor):
+    Email = apps.get_model("core", "Email")
+    emails = list(Email.objects.only("id", "from_email"))
+    for email in emails:
+        (
+            email.sender_name,
+            email.sender_address,
+            email.sender_domain,
+        ) = parse_sender(email.from_email)
+    Email.objects.bulk_update(
+        emails, ["sender_name", "sender_address", "sender_domain"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='sender_address',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='sender_domain',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='sender_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(populate_sender_fields, migrations.RunPython.noop),
+    ]
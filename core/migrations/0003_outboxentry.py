@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_email_sender_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('msg_id', models.CharField(max_length=20)),
+                ('add_label_ids', models.CharField(blank=True, default='', max_length=255)),
+                ('remove_label_ids', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('msg_id', 'add_label_ids', 'remove_label_ids'), name='unique_outbox_label_delta')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_outboxentry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="email",
+            index=models.Index(
+                fields=["received_at", "id"], name="core_email_receive_637c82_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_email_received_at_id_index"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="outboxentry",
+            name="unique_outbox_label_delta",
+        ),
+        migrations.AddField(
+            model_name="email",
+            name="thread_id",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=20
+            ),
+        ),
+        migrations.AddField(
+            model_name="outboxentry",
+            name="kind",
+            field=models.CharField(
+                choices=[("message", "Message"), ("thread", "Thread")],
+                default="message",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="outboxentry",
+            name="message_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddConstraint(
+            model_name="outboxentry",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "msg_id", "add_label_ids", "remove_label_ids"),
+                name="unique_outbox_target_label_delta",
+            ),
+        ),
+    ]
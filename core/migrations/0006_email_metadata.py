@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_thread_scope"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="email",
+            name="attachment_bytes",
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name="email",
+            name="attachment_count",
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name="email",
+            name="cc_addresses",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="email",
+            name="label_bits",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="email",
+            name="size_estimate",
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name="email",
+            name="to_addresses",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
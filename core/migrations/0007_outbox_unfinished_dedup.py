@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_email_metadata"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="outboxentry",
+            name="unique_outbox_target_label_delta",
+        ),
+        migrations.AddField(
+            model_name="outboxentry",
+            name="claimed_by",
+            field=models.CharField(blank=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="outboxentry",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("in_flight", "In Flight"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                db_index=True,
+                default="pending",
+                max_length=10,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="outboxentry",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["pending", "in_flight"])),
+                fields=("kind", "msg_id", "add_label_ids", "remove_label_ids"),
+                name="unique_unfinished_outbox_target_label_delta",
+            ),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_recipients(apps, schema_editor):
+    Email = apps.get_model("core", "Email")
+    Recipient = apps.get_model("core", "Recipient")
+    recipients = [
+        Recipient(email_id=email.id, kind=kind, address=address)
+        for email in Email.objects.only("id", "to_addresses", "cc_addresses")
+        for kind, addresses in (("to", email.to_addresses), ("cc", email.cc_addresses))
+        for address in addresses.split(",")
+        if address
+    ]
+    Recipient.objects.bulk_create(recipients, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_outbox_unfinished_dedup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Recipient",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("to", "To"), ("cc", "Cc")], max_length=2
+                    ),
+                ),
+                ("address", models.CharField(max_length=255)),
+                (
+                    "email",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recipients",
+                        to="core.email",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["address", "kind"],
+                        name="core_recipi_address_198aad_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_recipients, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,122 @@
+from typing import Iterable
+
 from django.db import models
 
+from core.utils import chunked
+
 # Create your models here.
 
 
 class Email(models.Model):
     from_email = models.CharField(max_length=255)
+    sender_name = models.CharField(max_length=255, blank=True, default="")
+    sender_address = models.CharField(
+        max_length=255, blank=True, default="", db_index=True
+    )
+    sender_domain = models.CharField(
+        max_length=255, blank=True, default="", db_index=True
+    )
     subject = models.CharField(max_length=255)
     message = models.TextField()
     received_at = models.DateTimeField()
     msg_id = models.CharField(max_length=20)
+    thread_id = models.CharField(max_length=20, blank=True, default="", db_index=True)
+    # metadata from the MIME structure, so rules on it never read message bodies;
+    # the addresses are also stored one per row in Recipient for equality lookups
+    to_addresses = models.TextField(blank=True, default="")
+    cc_addresses = models.TextField(blank=True, default="")
+    size_estimate = models.PositiveIntegerField(default=0, db_index=True)
+    attachment_count = models.PositiveIntegerField(default=0, db_index=True)
+    attachment_bytes = models.PositiveBigIntegerField(default=0, db_index=True)
+    # one bit per core.metadata.SYSTEM_LABELS entry
+    label_bits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["received_at", "id"])]
 
     def __str__(self) -> str:
         return f"{self.msg_id} {self.subject}"
+
+
+class RecipientManager(models.Manager):
+    def store(self, emails: Iterable[Email]) -> None:
+        """Create the recipients of saved ``emails`` from their address lists."""
+        recipients = (
+            Recipient(email_id=email.pk, kind=kind, address=address)
+            for email in emails
+            for kind, addresses in (
+                (Recipient.Kind.TO, email.to_addresses),
+                (Recipient.Kind.CC, email.cc_addresses),
+            )
+            for address in addresses.split(",")
+            if address
+        )
+        for chunk in chunked(recipients, 2000):
+            self.bulk_create(chunk)
+
+    def rebuild(self, emails: models.QuerySet) -> None:
+        self.filter(email__in=emails).delete()
+        self.store(
+            emails.only("pk", "to_addresses", "cc_addresses").iterator(chunk_size=2000)
+        )
+
+
+class Recipient(models.Model):
+    class Kind(models.TextChoices):
+        TO = "to"
+        CC = "cc"
+
+    email = models.ForeignKey(
+        Email, on_delete=models.CASCADE, related_name="recipients"
+    )
+    kind = models.CharField(max_length=2, choices=Kind.choices)
+    address = models.CharField(max_length=255)
+
+    objects = RecipientManager()
+
+    class Meta:
+        indexes = [models.Index(fields=["address", "kind"])]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.address}"
+
+
+class OutboxEntry(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        IN_FLIGHT = "in_flight"
+        DONE = "done"
+        FAILED = "failed"
+
+    class Kind(models.TextChoices):
+        MESSAGE = "message"
+        THREAD = "thread"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices, default=Kind.MESSAGE)
+    # the message id, or the thread id for thread entries
+    msg_id = models.CharField(max_length=20)
+    message_count = models.PositiveIntegerField(default=1)
+    add_label_ids = models.CharField(max_length=255, blank=True, default="")
+    remove_label_ids = models.CharField(max_length=255, blank=True, default="")
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    # drainer holding an in flight entry
+    claimed_by = models.CharField(max_length=32, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # finished entries do not block planning the same change again
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "msg_id", "add_label_ids", "remove_label_ids"],
+                condition=models.Q(status__in=["pending", "in_flight"]),
+                name="unique_unfinished_outbox_target_label_delta",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.msg_id} {self.status}"
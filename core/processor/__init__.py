@@ -11,7 +11,10 @@ class EmailProcessor(Protocol):
 
 class Process:
     rule: Rule
-    actions: list[Action] = []
+    actions: list[Action]
+
+    def __init__(self) -> None:
+        self.actions = []
 
     def add(self, process_dict: dict):
         rule = process_dict["rule"]
@@ -28,7 +31,7 @@ class Process:
 
         if conditions is None:
             raise ConditionError("'conditions' parameter is missing in rule")
-        self.rule = Rule(rule_type, conditions)
+        self.rule = Rule(rule_type, conditions, rule_dict.get("scope", "message"))
 
     def _set_actions(self, actions: list):
         for action in actions:
@@ -1,7 +1,7 @@
 import enum
 from typing import Optional, Self
 
-from core.processor.exception import ActionTypeError
+from core.processor.exception import ActionError, ActionTypeError
 
 
 class ActionType(str, enum.Enum):
@@ -10,10 +10,10 @@ class ActionType(str, enum.Enum):
 
     @classmethod
     def fetch(cls, type: str) -> Self:
-        for _enum in cls:
-            if _enum.value == type:
-                return _enum
-        raise ActionTypeError(f"type '{type} is invalid'")
+        member = cls._value2member_map_.get(type)
+        if member is None:
+            raise ActionTypeError(f"type '{type} is invalid'")
+        return member
 
 
 class Action:
@@ -23,3 +23,9 @@ class Action:
     def __init__(self, action: dict) -> None:
         self.type = ActionType.fetch(action["type"])
         self.value = action.get("value")
+        if self.type == ActionType.MOVE_MESSAGE and not self.value:
+            raise ActionError(f"'value' is required for {self.type.value}")
+
+    @property
+    def key(self) -> tuple:
+        return (self.type, self.value)
@@ -1,24 +1,55 @@
 import enum
+import re
 from typing import Any, Literal, Optional, Self
 
+from core.metadata import label_mask
 from core.processor.exception import ConditionError, ConditionTypeError
+from core.processor.patterns import compile_regex, normalize_keywords
 
-CONDITION_FIELDS = ["from", "subject", "message", "received"]
-STRING_PREDICATES = ["contains", "not_contains", "equals", "not_equals"]
+NUMBER_FIELDS = ["size", "attachments", "attachment_size"]
+RECIPIENT_FIELDS = ["to", "cc"]
+CONDITION_FIELDS = [
+    "from",
+    "subject",
+    "message",
+    "received",
+    *RECIPIENT_FIELDS,
+    *NUMBER_FIELDS,
+    "labels",
+]
+REGEX_PREDICATES = ["matches_regex", "not_matches_regex"]
+KEYWORD_PREDICATES = ["contains_any", "not_contains_any"]
+STRING_PREDICATES = [
+    "contains",
+    "not_contains",
+    "equals",
+    "not_equals",
+    *REGEX_PREDICATES,
+    *KEYWORD_PREDICATES,
+]
 DATETIME_PREDICATES = ["less_than", "greater_than"]
+NUMBER_PREDICATES = ["less_than", "greater_than", "equals", "not_equals"]
+LABEL_PREDICATES = ["contains", "not_contains"]
 FILTERS = ["days"]
+NEGATED_PREDICATES = {
+    "not_contains": "contains",
+    "not_equals": "equals",
+    "not_matches_regex": "matches_regex",
+    "not_contains_any": "contains_any",
+}
 
 
 class ConditionType(str, enum.Enum):
     STRING = "string"
     DATETIME = "datetime"
+    NUMBER = "number"
 
     @classmethod
     def fetch(cls, type: str) -> Self:
-        for _enum in cls:
-            if _enum.value == type:
-                return _enum
-        raise ConditionTypeError(f"type '{type} is invalid'")
+        member = cls._value2member_map_.get(type)
+        if member is None:
+            raise ConditionTypeError(f"type '{type} is invalid'")
+        return member
 
 
 class Condition:
@@ -33,9 +64,32 @@ class Condition:
         self.field = condition_dict["field"]
         self.predicate = condition_dict["predicate"]
         self.value = condition_dict["value"]
-        self.type = condition_dict["type"]
+        self.type = ConditionType.fetch(condition_dict["type"])
         self.filter = condition_dict.get("filter")
 
+    @property
+    def is_negated(self) -> bool:
+        return self.predicate in NEGATED_PREDICATES
+
+    @property
+    def key(self) -> tuple:
+        predicate = NEGATED_PREDICATES.get(self.predicate, self.predicate)
+        if self.type in (ConditionType.DATETIME, ConditionType.NUMBER):
+            value = int(self.value)
+        elif self.field == "labels":
+            value = str(self.value).strip().upper()
+        elif predicate == "matches_regex":
+            value = str(self.value)
+        elif predicate == "contains_any":
+            value = normalize_keywords(self.value)
+        else:
+            # the key must not merge values the query tells apart: whitespace
+            # is matched as is and databases only reliably fold ascii case
+            value = str(self.value)
+            if value.isascii():
+                value = value.lower()
+        return (self.field, predicate, value, self.type, self.filter)
+
     def _validate_condition_dict(self, condition_dict: dict):
         field = condition_dict["field"]
         predicate = condition_dict["predicate"]
@@ -51,6 +105,47 @@ class Condition:
         if type == ConditionType.DATETIME and predicate not in DATETIME_PREDICATES:
             raise ConditionError(f"Invalid predicate {predicate} for type {type}")
 
+        if type == ConditionType.NUMBER and predicate not in NUMBER_PREDICATES:
+            raise ConditionError(f"Invalid predicate {predicate} for type {type}")
+
+        if (type == ConditionType.NUMBER) != (field in NUMBER_FIELDS):
+            if type in ConditionType._value2member_map_:
+                raise ConditionError(f"field {field} does not support type {type}")
+
+        if type == ConditionType.NUMBER:
+            try:
+                if int(condition_dict["value"]) < 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                raise ConditionError(f"Invalid value {condition_dict['value']}")
+
+        if field == "labels":
+            if predicate not in LABEL_PREDICATES:
+                raise ConditionError(f"Invalid predicate {predicate} for labels")
+            if label_mask(str(condition_dict["value"])) is None:
+                raise ConditionError(f"Unknown label {condition_dict['value']}")
+
+        if predicate in REGEX_PREDICATES:
+            try:
+                compile_regex(str(condition_dict["value"]))
+            except re.error as error:
+                raise ConditionError(
+                    f"Invalid regex {condition_dict['value']}: {error}"
+                )
+
+        if predicate in KEYWORD_PREDICATES:
+            value = condition_dict["value"]
+            if isinstance(value, str) or not normalize_keywords(value or []):
+                raise ConditionError(f"{predicate} needs a list of keywords")
+
+        if type == ConditionType.DATETIME:
+            if not filter:
+                raise ConditionError(f"filter is required for {type}")
+            try:
+                int(condition_dict["value"])
+            except (TypeError, ValueError):
+                raise ConditionError(f"Invalid value {condition_dict['value']}")
+
         if filter:
             if type != ConditionType.DATETIME:
                 raise ConditionError(f"filter is not supported for {type}")
@@ -1,11 +1,16 @@
 from core.processor import Process
+from core.processor.optimizer import OptimizerReport, QueryOptimizer
+from core.processor.plan import ExecutionPlan
 from core.processor.process_executor import ProcessExecutor
+from core.processor.process_executor.outbox import DrainReport
 from core.processor.search_engine import SearchEngine
+from core.profiling import stage
 
 
 class GmailProcessor:
     def __init__(self) -> None:
         self._processes = []
+        self.execution_report = DrainReport()
 
     def add(self, process_dict: dict):
         process = Process()
@@ -13,8 +18,17 @@ class GmailProcessor:
         self._processes.append(process)
         return self
 
-    def execute(self, search_engine: SearchEngine, executor: ProcessExecutor):
-        for process in self._processes:
-            msg_ids = search_engine.search(process.rule)
-            print(msg_ids)
-            executor.execute(process.actions, msg_ids)
+    def compile(self, search_engine: SearchEngine | None = None) -> ExecutionPlan:
+        with stage("compile"):
+            return ExecutionPlan.compile(self._processes, search_engine)
+
+    def execute(
+        self, search_engine: SearchEngine, executor: ProcessExecutor
+    ) -> OptimizerReport:
+        plan = self.compile(search_engine)
+        optimizer = QueryOptimizer(search_engine)
+        for process, msg_ids in optimizer.run(plan):
+            result = executor.execute(process.actions, msg_ids)
+            if isinstance(result, DrainReport):
+                self.execution_report.merge(result)
+        return optimizer.report
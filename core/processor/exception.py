@@ -2,6 +2,10 @@ class ActionTypeError(Exception):
     pass
 
 
+class ActionError(Exception):
+    pass
+
+
 class ConditionTypeError(Exception):
     pass
 
@@ -12,3 +16,15 @@ class ConditionError(Exception):
 
 class RuleTypeError(Exception):
     pass
+
+
+class BackendError(Exception):
+    pass
+
+
+class PushdownError(Exception):
+    pass
+
+
+class SearchError(Exception):
+    pass
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.utils import timezone
+
+from core.address import is_address, is_registrable_domain, parse_sender
+from core.metadata import label_mask
+from core.processor.condition import (
+    KEYWORD_PREDICATES,
+    RECIPIENT_FIELDS,
+    REGEX_PREDICATES,
+    Condition,
+    ConditionType,
+)
+from core.processor.patterns import compile_regex, keyword_matcher, normalize_keywords
+
+# keys of the email dicts matched in memory, named after the Email columns
+EMAIL_KEYS = {
+    "from": "from_email",
+    "to": "to_addresses",
+    "cc": "cc_addresses",
+    "size": "size_estimate",
+    "attachments": "attachment_count",
+    "attachment_size": "attachment_bytes",
+    "labels": "label_bits",
+}
+
+
+def match_string(condition: Condition, value: Optional[str]) -> bool:
+    if condition.predicate in REGEX_PREDICATES:
+        return compile_regex(str(condition.value)).search(value or "") is not None
+    if condition.predicate in KEYWORD_PREDICATES:
+        return keyword_matcher(normalize_keywords(condition.value)).search(value or "")
+    value = (value or "").casefold()
+    expected = str(condition.value).casefold()
+    if condition.predicate in ("contains", "not_contains"):
+        return expected in value
+    return expected == value
+
+
+def match_sender(condition: Condition, header: Optional[str]) -> bool:
+    if condition.predicate in ("equals", "not_equals"):
+        _, address, domain = parse_sender(header)
+        expected = str(condition.value).strip().lower()
+        if is_address(expected):
+            return address == expected
+        if is_registrable_domain(expected):
+            return domain == expected.lstrip("@")
+    return match_string(condition, header)
+
+
+def match_recipients(condition: Condition, addresses: Optional[str]) -> bool:
+    if condition.predicate in ("equals", "not_equals"):
+        expected = str(condition.value).strip().lower()
+        return expected in (addresses or "").split(",")
+    return match_string(condition, addresses)
+
+
+def match_number(condition: Condition, value: Optional[int]) -> bool:
+    value, expected = value or 0, int(condition.value)
+    if condition.predicate == "less_than":
+        return value < expected
+    if condition.predicate == "greater_than":
+        return value > expected
+    return value == expected
+
+
+def match_label(condition: Condition, bits: Optional[int]) -> bool:
+    mask = label_mask(str(condition.value))
+    return bool((bits or 0) & mask)
+
+
+def match_datetime(condition: Condition, received_at: datetime) -> bool:
+    cutoff = timezone.now() - timedelta(**{condition.filter: int(condition.value)})
+    if condition.predicate == "less_than":
+        return received_at < cutoff
+    return received_at > cutoff
+
+
+# negation is left to the caller, this is the positive match of the condition
+def matches(condition: Condition, email: dict) -> bool:
+    if condition.type == ConditionType.DATETIME:
+        return match_datetime(condition, email["received_at"])
+    value = email.get(EMAIL_KEYS.get(condition.field, condition.field))
+    if condition.type == ConditionType.NUMBER:
+        return match_number(condition, value)
+    if condition.field == "labels":
+        return match_label(condition, value)
+    if condition.field == "from":
+        return match_sender(condition, value)
+    if condition.field in RECIPIENT_FIELDS:
+        return match_recipients(condition, value)
+    return match_string(condition, value)
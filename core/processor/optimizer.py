@@ -0,0 +1,114 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from core.profiling import stage, timed
+from core.processor.plan import CompiledProcess, CompiledRule, ExecutionPlan
+from core.processor.rule import RuleType
+from core.processor.search_engine import CHUNK_SIZE, SearchEngine
+from core.utils import chunked
+
+
+@dataclass
+class OptimizerReport:
+    rules: int = 0
+    distinct_rules: int = 0
+    collapsed_rules: int = 0
+    streamed_rules: int = 0
+    conditions: int = 0
+    evaluations: int = 0
+
+    @property
+    def evaluations_saved(self) -> int:
+        return self.conditions - self.evaluations
+
+    def as_dict(self) -> dict:
+        return {
+            "rules": self.rules,
+            "distinct_rules": self.distinct_rules,
+            "collapsed_rules": self.collapsed_rules,
+            "streamed_rules": self.streamed_rules,
+            "conditions": self.conditions,
+            "evaluations": self.evaluations,
+            "evaluations_saved": self.evaluations_saved,
+        }
+
+
+class QueryOptimizer:
+    def __init__(self, search_engine: SearchEngine) -> None:
+        self._search_engine = search_engine
+        self._matches: dict[tuple, frozenset[str]] = {}
+        self._results: dict[tuple, frozenset[str]] = {}
+        self._universe: Optional[frozenset[str]] = None
+        self.report = OptimizerReport()
+
+    def run(
+        self, plan: ExecutionPlan
+    ) -> Iterator[tuple[CompiledProcess, Iterable[list[str]]]]:
+        seen = set()
+        processes = []
+        for process in plan:
+            self.report.rules += 1
+            self.report.conditions += len(process.rule.conditions)
+            process_key = (process.rule.key, process.actions.key)
+            if process_key in seen:
+                self.report.collapsed_rules += 1
+                continue
+            seen.add(process_key)
+            processes.append(process)
+
+        rule_uses = Counter(process.rule.key for process in processes)
+        condition_uses = Counter(
+            key for process in processes for key in self._condition_keys(process.rule)
+        )
+        for process in processes:
+            keys = self._condition_keys(process.rule)
+            if rule_uses[process.rule.key] == 1 and all(
+                condition_uses[key] == 1 for key in keys
+            ):
+                # nothing to share, stream the rule straight from the engine
+                self.report.streamed_rules += 1
+                self.report.distinct_rules += 1
+                self.report.evaluations += len(keys)
+                yield process, timed("search", self._search_engine.search(process.rule))
+            else:
+                msg_ids = sorted(self.evaluate(process.rule))
+                yield process, chunked(msg_ids, CHUNK_SIZE)
+
+    @staticmethod
+    def _condition_keys(rule: CompiledRule) -> set[tuple]:
+        return {condition.key for condition in rule.conditions}
+
+    def evaluate(self, rule: CompiledRule) -> frozenset[str]:
+        rule_key = rule.key
+        if rule_key in self._results:
+            return self._results[rule_key]
+        self.report.distinct_rules += 1
+
+        positives = [self._match(c) for c in rule.conditions if not c.is_negated]
+        negations = [self._match(c) for c in rule.conditions if c.is_negated]
+        if not positives:
+            result = self._all()
+        elif rule.type == RuleType.ALL:
+            result = frozenset.intersection(*positives)
+        else:
+            result = frozenset.union(*positives)
+        if negations:
+            result = result - frozenset.intersection(*negations)
+
+        self._results[rule_key] = result
+        return result
+
+    def _match(self, condition) -> frozenset[str]:
+        key = condition.key
+        if key not in self._matches:
+            self.report.evaluations += 1
+            with stage("search"):
+                self._matches[key] = frozenset(self._search_engine.match(condition))
+        return self._matches[key]
+
+    def _all(self) -> frozenset[str]:
+        if self._universe is None:
+            with stage("search"):
+                self._universe = frozenset(self._search_engine.all())
+        return self._universe
@@ -0,0 +1,120 @@
+import functools
+import re
+from typing import Iterable, Optional
+
+try:
+    # the parser is private and has moved before, without it nothing is narrowed
+    from re import _constants as sre, _parser as sre_parse
+except ImportError:
+    sre = sre_parse = None
+
+REGEX_CACHE_SIZE = 1024
+# shorter literals narrow too little to be worth a LIKE clause
+MIN_LITERAL_LENGTH = 3
+
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compile_regex(pattern: str) -> re.Pattern:
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def normalize_keywords(keywords: Iterable[str]) -> tuple[str, ...]:
+    keywords = {str(keyword).strip().casefold() for keyword in keywords}
+    keywords.discard("")
+    return tuple(sorted(keywords))
+
+
+def minimal_keywords(keywords: Iterable[str]) -> tuple[str, ...]:
+    """Drop keywords that contain another keyword, they can never decide a match."""
+    kept: list[str] = []
+    for keyword in sorted(set(keywords), key=len):
+        if not any(shorter in keyword for shorter in kept):
+            kept.append(keyword)
+    return tuple(sorted(kept))
+
+
+def keywords_pattern(keywords: Iterable[str]) -> str:
+    """A regex matching any of ``keywords``, checked in one pass."""
+    keywords = minimal_keywords(normalize_keywords(keywords))
+    return "|".join(re.escape(keyword) for keyword in keywords)
+
+
+class KeywordMatcher:
+    """Find whether a text contains any of a set of keywords.
+
+    Uses an Aho-Corasick automaton from ``pyahocorasick`` when it is installed,
+    which checks the text in one pass whatever the number of keywords.
+    Otherwise each remaining keyword is looked up with ``in``.
+    """
+
+    def __init__(self, keywords: Iterable[str]) -> None:
+        self.keywords = minimal_keywords(normalize_keywords(keywords))
+        self._automaton = None
+        try:
+            import ahocorasick
+        except ImportError:
+            return
+        automaton = ahocorasick.Automaton()
+        for keyword in self.keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        self._automaton = automaton
+
+    def search(self, text: str) -> bool:
+        text = text.casefold()
+        if self._automaton is not None:
+            return next(self._automaton.iter(text), None) is not None
+        return any(keyword in text for keyword in self.keywords)
+
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def keyword_matcher(keywords: tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def required_literals(pattern: str) -> Optional[list[tuple[str, ...]]]:
+    """Literals a text must contain for ``pattern`` to match it.
+
+    Returns alternatives, one per top level branch of the pattern; a text can
+    only match if it contains every literal of at least one alternative.
+    Returns None when some branch requires no literal, so nothing can be
+    narrowed. Literals are casefolded as matching is case insensitive.
+    """
+    if sre_parse is None:
+        return None
+    items = list(sre_parse.parse(pattern))
+    if len(items) == 1 and items[0][0] is sre.BRANCH:
+        branches = [list(branch) for branch in items[0][1][1]]
+    else:
+        branches = [items]
+    alternatives = [_sequence_literals(branch) for branch in branches]
+    if not all(alternatives):
+        return None
+    return [tuple(literals) for literals in alternatives]
+
+
+def _sequence_literals(items) -> list[str]:
+    literals, run = [], []
+
+    def flush():
+        literal = "".join(run).casefold()
+        # the database only folds ascii case, other literals could wrongly narrow
+        if len(literal) >= MIN_LITERAL_LENGTH and literal.isascii():
+            literals.append(literal)
+        run.clear()
+
+    for op, av in items:
+        if op is sre.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre.SUBPATTERN:
+            literals.extend(_sequence_literals(av[-1]))
+        elif op is sre.ATOMIC_GROUP:
+            literals.extend(_sequence_literals(av))
+        elif op in (sre.MAX_REPEAT, sre.MIN_REPEAT, sre.POSSESSIVE_REPEAT):
+            minimum, _, item = av
+            if minimum >= 1:
+                literals.extend(_sequence_literals(item))
+    flush()
+    return list(dict.fromkeys(literals))
@@ -0,0 +1,126 @@
+from typing import Any, Iterable, Optional
+
+from core.processor import Process
+from core.processor.action import Action, ActionType
+from core.processor.condition import KEYWORD_PREDICATES, Condition, ConditionType
+from core.processor.patterns import normalize_keywords
+from core.processor.rule import Rule, RuleScope
+
+
+class Frozen:
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _init(self, **values: Any) -> None:
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+class CompiledCondition(Frozen):
+    __slots__ = (
+        "field",
+        "predicate",
+        "value",
+        "type",
+        "filter",
+        "is_negated",
+        "key",
+        "fragment",
+    )
+
+    def __init__(self, condition: Condition, fragment: Any = None) -> None:
+        value = condition.value
+        if condition.type in (ConditionType.DATETIME, ConditionType.NUMBER):
+            value = int(value)
+        elif condition.predicate in KEYWORD_PREDICATES:
+            value = normalize_keywords(value)
+        self._init(
+            field=condition.field,
+            predicate=condition.predicate,
+            value=value,
+            type=condition.type,
+            filter=condition.filter,
+            is_negated=condition.is_negated,
+            key=condition.key,
+            fragment=fragment,
+        )
+
+
+class CompiledRule(Frozen):
+    __slots__ = ("type", "conditions", "key")
+
+    def __init__(self, rule: Rule, conditions: tuple[CompiledCondition, ...]) -> None:
+        self._init(type=rule.type, conditions=conditions, key=rule.key)
+
+
+class ActionSet(Frozen):
+    __slots__ = ("actions", "labels_to_add", "labels_to_remove", "scope", "key")
+
+    def __init__(
+        self, actions: Iterable[Action], scope: RuleScope = RuleScope.MESSAGE
+    ) -> None:
+        actions = tuple(dict.fromkeys(action.key for action in actions))
+        labels_to_add, labels_to_remove = [], []
+        for action_type, value in actions:
+            if action_type == ActionType.MOVE_MESSAGE:
+                labels_to_add.append(value.upper())
+            elif action_type == ActionType.MARK_AS_READ:
+                labels_to_remove.append("UNREAD")
+        self._init(
+            actions=actions,
+            labels_to_add=tuple(dict.fromkeys(labels_to_add)),
+            labels_to_remove=tuple(dict.fromkeys(labels_to_remove)),
+            scope=scope,
+            key=(scope, tuple(sorted(actions, key=repr))),
+        )
+
+
+class CompiledProcess(Frozen):
+    __slots__ = ("rule", "actions")
+
+    def __init__(self, rule: CompiledRule, actions: ActionSet) -> None:
+        self._init(rule=rule, actions=actions)
+
+
+class ExecutionPlan(Frozen):
+    __slots__ = ("processes",)
+
+    def __init__(self, processes: Iterable[CompiledProcess]) -> None:
+        self._init(processes=tuple(processes))
+
+    def __iter__(self):
+        return iter(self.processes)
+
+    def __len__(self) -> int:
+        return len(self.processes)
+
+    @classmethod
+    def compile(
+        cls, processes: Iterable[Process], search_engine: Optional[Any] = None
+    ) -> "ExecutionPlan":
+        compile_condition = getattr(search_engine, "compile_condition", None)
+        fragments: dict[tuple, Any] = {}
+
+        def compiled(condition: Condition) -> CompiledCondition:
+            fragment = None
+            if compile_condition is not None:
+                if condition.key not in fragments:
+                    fragments[condition.key] = compile_condition(condition)
+                fragment = fragments[condition.key]
+            return CompiledCondition(condition, fragment)
+
+        return cls(
+            CompiledProcess(
+                CompiledRule(
+                    process.rule,
+                    tuple(compiled(condition) for condition in process.rule.conditions),
+                ),
+                ActionSet(process.actions, process.rule.scope),
+            )
+            for process in processes
+        )
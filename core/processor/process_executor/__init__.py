@@ -1,7 +1,7 @@
-from typing import Protocol
+from typing import Iterable, Protocol
 
-from core.processor import Action
+from core.processor.plan import ActionSet
 
 
 class ProcessExecutor(Protocol):
-    def execute(self, actions: list[Action], msg_ids: list[str]): ...
+    def execute(self, actions: ActionSet, msg_ids: Iterable[list[str]]): ...
@@ -1,47 +1,79 @@
 import os.path
+from datetime import timedelta
+from typing import Any, Iterable, Optional
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from django.conf import settings
 
-from core.processor.action import Action, ActionType
+from core.processor.plan import ActionSet
+from core.processor.rule import RuleScope
+from core.models import OutboxEntry
+from core.processor.process_executor.outbox import (
+    DrainReport,
+    OutboxDrainer,
+    ThreadGrouping,
+    enqueue,
+)
+from core.profiling import stage
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 
 
 class GmailProcessExecutor:
-    def __init__(self) -> None:
+    def __init__(
+        self, workers: Optional[int] = None, batch_size: Optional[int] = None
+    ) -> None:
+        self.workers = workers or settings.GMAIL_EXECUTOR["WORKERS"]
+        self.batch_size = batch_size or settings.GMAIL_EXECUTOR["BATCH_SIZE"]
         self._creds = None
-        self._authenticate()
-
-    def execute(self, actions: list[Action], msg_ids: list[str]):
-        labels_to_add = []
-        labels_to_remove = []
-        for action in actions:
-            if action.type == ActionType.MOVE_MESSAGE:
-                labels_to_add.append(action.value.upper())
-            elif action.type == ActionType.MARK_AS_READ:
-                labels_to_remove.append("UNREAD")
-
-        service = build("gmail", "v1", credentials=self._creds)
-        bt = service.new_batch_http_request()
-        for message_id in msg_ids:
-            bt.add(
-                service.users()
-                .messages()
-                .modify(
-                    userId="me",
-                    id=message_id,
-                    body={
-                        "addLabelIds": labels_to_add,
-                        "removeLabelIds": labels_to_remove,
-                    },
-                )
-            )
-        bt.execute()
+        with stage("auth"):
+            self._authenticate()
+
+    def execute(self, actions: ActionSet, msg_ids: Iterable[list[str]]) -> DrainReport:
+        drainer = self._drainer()
+        threads = ThreadGrouping() if actions.scope == RuleScope.THREAD else None
+        add, remove = actions.labels_to_add, actions.labels_to_remove
+        done_within = timedelta(minutes=settings.GMAIL_EXECUTOR["DONE_WITHIN_MINUTES"])
+        for chunk in msg_ids:
+            with stage("enqueue"):
+                if threads is not None:
+                    matched, chunk = threads.group(chunk)
+                    enqueue(
+                        matched,
+                        add,
+                        remove,
+                        kind=OutboxEntry.Kind.THREAD,
+                        message_counts=matched,
+                        done_within=done_within,
+                    )
+                enqueue(chunk, add, remove, done_within=done_within)
+            drainer.drain(complete=False)
+        return drainer.drain()
+
+    def drain(self) -> DrainReport:
+        return self._drainer().drain()
+
+    def _drainer(self) -> OutboxDrainer:
+        return OutboxDrainer(
+            self._service(),
+            batch_size=self.batch_size,
+            workers=self.workers,
+            service_factory=self._service,
+        )
+
+    def _service(self) -> Any:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build
+
+        # every call gets its own connection, httplib2.Http is not thread safe
+        http = AuthorizedHttp(self._creds, http=httplib2.Http())
+        return build("gmail", "v1", http=http, cache_discovery=False)
 
     def _authenticate(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
         if os.path.exists("token.json"):
             self._creds = Credentials.from_authorized_user_file("token.json", SCOPES)
         if not self._creds or not self._creds.valid:
@@ -0,0 +1,336 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Iterable, Optional
+
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from core.models import Email, OutboxEntry
+from core.profiling import stage
+from core.utils import chunked
+
+GMAIL_BATCH_LIMIT = 100
+# statuses Gmail answers rate limited and transiently failing requests with
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class DrainReport:
+    sent: int = 0
+    failed: int = 0
+    calls_saved: int = 0
+    # error of every failed message or thread id, in outbox order
+    errors: dict[str, str] = field(default_factory=dict)
+
+    def merge(self, other: "DrainReport") -> "DrainReport":
+        self.sent += other.sent
+        self.failed += other.failed
+        self.calls_saved += other.calls_saved
+        self.errors.update(other.errors)
+        return self
+
+
+def is_retryable(error: Optional[Exception]) -> bool:
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status == 403:
+        # exceeded per user rate limits are reported as forbidden
+        return "rate limit" in str(error).lower()
+    return status in RETRYABLE_STATUSES
+
+
+def label_key(labels: Iterable[str]) -> str:
+    return ",".join(sorted(set(labels)))
+
+
+def enqueue(
+    msg_ids: Iterable[str],
+    labels_to_add: Iterable[str],
+    labels_to_remove: Iterable[str],
+    chunk_size: int = 1000,
+    kind: str = OutboxEntry.Kind.MESSAGE,
+    message_counts: Optional[dict[str, int]] = None,
+    done_within: timedelta = timedelta(hours=1),
+) -> None:
+    add_label_ids = label_key(labels_to_add)
+    remove_label_ids = label_key(labels_to_remove)
+    message_counts = message_counts or {}
+    done_since = timezone.now() - done_within
+    for chunk in chunked(msg_ids, chunk_size):
+        # a change applied within ``done_within``, e.g. by a run that crashed
+        # and was started again, is not sent twice
+        done = set(
+            OutboxEntry.objects.filter(
+                kind=kind,
+                msg_id__in=chunk,
+                add_label_ids=add_label_ids,
+                remove_label_ids=remove_label_ids,
+                status=OutboxEntry.Status.DONE,
+                updated_at__gte=done_since,
+            ).values_list("msg_id", flat=True)
+        )
+        entries = [
+            OutboxEntry(
+                kind=kind,
+                msg_id=msg_id,
+                message_count=message_counts.get(msg_id, 1),
+                add_label_ids=add_label_ids,
+                remove_label_ids=remove_label_ids,
+            )
+            for msg_id in chunk
+            if msg_id not in done
+        ]
+        # entries already waiting to be sent are skipped
+        OutboxEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class ThreadGrouping:
+    """Map the matches of a thread scoped rule to their threads.
+
+    A match applies the change to its whole thread, so each thread is queued
+    once per run, with the number of messages the local store has of it.
+    Matches without a known thread are modified one by one.
+    """
+
+    def __init__(self) -> None:
+        self._queued: set[str] = set()
+
+    def group(self, msg_ids: list[str]) -> tuple[dict[str, int], list[str]]:
+        """Return the threads not queued yet with their message counts, and
+        the ids to modify one by one."""
+        threads = dict(
+            Email.objects.filter(msg_id__in=msg_ids)
+            .exclude(thread_id="")
+            .values_list("msg_id", "thread_id")
+        )
+        new = [
+            thread_id
+            for thread_id in dict.fromkeys(threads.get(msg_id) for msg_id in msg_ids)
+            if thread_id is not None and thread_id not in self._queued
+        ]
+        self._queued.update(new)
+        sizes = dict(
+            Email.objects.filter(thread_id__in=new)
+            .values("thread_id")
+            .annotate(count=Count("msg_id", distinct=True))
+            .values_list("thread_id", "count")
+        )
+        messages = [msg_id for msg_id in msg_ids if msg_id not in threads]
+        return {thread_id: sizes[thread_id] for thread_id in new}, messages
+
+
+class OutboxDrainer:
+    """Send pending outbox entries as Gmail batch requests.
+
+    With more than one worker, up to ``workers`` batches are sent at once on a
+    thread pool. httplib2 connections are not thread safe, so every worker
+    thread gets its own service from ``service_factory``. Workers only talk to
+    Gmail; outcomes are recorded from the calling thread in outbox order.
+
+    Entries are claimed before they are sent, so drainers running at the same
+    time never send the same entry. Claims older than ``claim_timeout`` are
+    left over by a crashed run and are sent again; modify calls are
+    idempotent.
+
+    Entries Gmail rejects with a rate limit or a transient server error are
+    sent again up to ``retries`` times, waiting ``backoff`` seconds and
+    twice as long before every further retry.
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        batch_size: int = 50,
+        max_attempts: int = 3,
+        workers: int = 1,
+        service_factory: Optional[Callable[[], Any]] = None,
+        claim_timeout: timedelta = timedelta(minutes=10),
+        retries: int = 3,
+        backoff: float = 0.5,
+    ) -> None:
+        self._service = service
+        self._batch_size = min(batch_size, GMAIL_BATCH_LIMIT)
+        self._max_attempts = max_attempts
+        self._workers = max(workers, 1)
+        self._service_factory = service_factory
+        self._claim_timeout = claim_timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._claim_id = uuid.uuid4().hex
+        self._local = threading.local()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._resumed = False
+        self.report = DrainReport()
+
+    def drain(self, complete: bool = True) -> DrainReport:
+        if not self._resumed:
+            self._resume()
+            self._resumed = True
+
+        last_id = 0
+        while True:
+            entries = list(
+                OutboxEntry.objects.filter(
+                    status=OutboxEntry.Status.PENDING, id__gt=last_id
+                ).order_by("id")[: self._batch_size * self._workers]
+            )
+            # a partial drain leaves an incomplete batch for the next chunk
+            if not complete:
+                entries = entries[: len(entries) - len(entries) % self._batch_size]
+            if not entries:
+                if complete:
+                    self.close()
+                return self.report
+            last_id = entries[-1].id
+            entries = self._claim(entries)
+            batches = [
+                entries[start : start + self._batch_size]
+                for start in range(0, len(entries), self._batch_size)
+            ]
+            for batch, outcomes in zip(batches, self._request_all(batches)):
+                self._record(batch, outcomes, self.report)
+
+    def _resume(self) -> None:
+        stale = timezone.now() - self._claim_timeout
+        OutboxEntry.objects.filter(
+            status=OutboxEntry.Status.IN_FLIGHT, updated_at__lt=stale
+        ).update(status=OutboxEntry.Status.PENDING, claimed_by="")
+        retry = Q(status=OutboxEntry.Status.FAILED, attempts__lt=self._max_attempts)
+        # a failed change that was planned again is sent by the newer entry
+        newer = OutboxEntry.objects.filter(
+            Q(status__in=[OutboxEntry.Status.PENDING, OutboxEntry.Status.IN_FLIGHT])
+            | retry & Q(id__gt=OuterRef("id")),
+            kind=OuterRef("kind"),
+            msg_id=OuterRef("msg_id"),
+            add_label_ids=OuterRef("add_label_ids"),
+            remove_label_ids=OuterRef("remove_label_ids"),
+        )
+        OutboxEntry.objects.filter(retry, Exists(newer)).delete()
+        OutboxEntry.objects.filter(retry).update(status=OutboxEntry.Status.PENDING)
+
+    def _claim(self, entries: list[OutboxEntry]) -> list[OutboxEntry]:
+        ids = [entry.id for entry in entries]
+        OutboxEntry.objects.filter(
+            id__in=ids, status=OutboxEntry.Status.PENDING
+        ).update(
+            status=OutboxEntry.Status.IN_FLIGHT,
+            claimed_by=self._claim_id,
+            updated_at=timezone.now(),
+        )
+        claimed = set(
+            OutboxEntry.objects.filter(
+                id__in=ids,
+                status=OutboxEntry.Status.IN_FLIGHT,
+                claimed_by=self._claim_id,
+            ).values_list("id", flat=True)
+        )
+        return [entry for entry in entries if entry.id in claimed]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _request_all(self, batches: list[list[OutboxEntry]]) -> Iterable[dict]:
+        if self._workers == 1 or len(batches) == 1:
+            return map(self._request, batches)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="outbox"
+            )
+        # map yields in submission order whatever order the batches finish in
+        return self._pool.map(self._request, batches)
+
+    def _worker_service(self) -> Any:
+        if self._service_factory is None:
+            return self._service
+        if not hasattr(self._local, "service"):
+            self._local.service = self._service_factory()
+        return self._local.service
+
+    def _request(self, entries: list[OutboxEntry]) -> dict[str, Any]:
+        outcomes: dict[str, Any] = {}
+        for attempt in range(self._retries + 1):
+            if attempt:
+                time.sleep(self._backoff * 2 ** (attempt - 1))
+            outcomes.update(self._send(entries))
+            entries = [
+                entry for entry in entries if is_retryable(outcomes.get(str(entry.id)))
+            ]
+            if not entries:
+                break
+        return outcomes
+
+    def _send(self, entries: list[OutboxEntry]) -> dict[str, Any]:
+        service = self._worker_service()
+        outcomes: dict[str, Any] = {}
+
+        def callback(request_id, response, exception):
+            outcomes[request_id] = exception
+
+        bt = service.new_batch_http_request(callback=callback)
+        for entry in entries:
+            if entry.kind == OutboxEntry.Kind.THREAD:
+                resource = service.users().threads()
+            else:
+                resource = service.users().messages()
+            bt.add(
+                resource.modify(
+                    userId="me",
+                    id=entry.msg_id,
+                    body={
+                        "addLabelIds": self._labels(entry.add_label_ids),
+                        "removeLabelIds": self._labels(entry.remove_label_ids),
+                    },
+                ),
+                request_id=str(entry.id),
+            )
+        try:
+            with stage("modify"):
+                bt.execute()
+        except Exception as error:
+            # a failed batch fails the entries that got no response
+            for entry in entries:
+                outcomes.setdefault(str(entry.id), error)
+        return outcomes
+
+    def _record(
+        self, entries: list[OutboxEntry], outcomes: dict[str, Any], report: DrainReport
+    ) -> None:
+        done, failed = [], []
+        for entry in entries:
+            exception = outcomes.get(str(entry.id))
+            if str(entry.id) in outcomes and exception is None:
+                done.append(entry.id)
+                report.errors.pop(entry.msg_id, None)
+            else:
+                failed.append(entry.id)
+                error = str(exception or "no response")
+                report.errors[entry.msg_id] = error
+                OutboxEntry.objects.filter(id=entry.id).update(error=error)
+        OutboxEntry.objects.filter(id__in=done).update(
+            status=OutboxEntry.Status.DONE,
+            attempts=F("attempts") + 1,
+            error="",
+            claimed_by="",
+            updated_at=timezone.now(),
+        )
+        OutboxEntry.objects.filter(id__in=failed).update(
+            status=OutboxEntry.Status.FAILED,
+            attempts=F("attempts") + 1,
+            claimed_by="",
+            updated_at=timezone.now(),
+        )
+        report.sent += len(done)
+        report.failed += len(failed)
+        done_ids = set(done)
+        report.calls_saved += sum(
+            entry.message_count - 1 for entry in entries if entry.id in done_ids
+        )
+
+    @staticmethod
+    def _labels(label_ids: str) -> list[str]:
+        return label_ids.split(",") if label_ids else []
@@ -11,25 +11,47 @@ class RuleType(str, enum.Enum):
 
     @classmethod
     def is_valid(cls, type: str) -> bool:
-        return any(enum.value == type for enum in cls)
+        return type in cls._value2member_map_
 
     @classmethod
     def fetch(cls, type: str) -> Self:
-        for _enum in cls:
-            if _enum.value == type:
-                return _enum
-        raise RuleTypeError(f"type '{type} is invalid'")
+        member = cls._value2member_map_.get(type)
+        if member is None:
+            raise RuleTypeError(f"type '{type} is invalid'")
+        return member
+
+
+class RuleScope(str, enum.Enum):
+    MESSAGE = "message"
+    THREAD = "thread"
+
+    @classmethod
+    def fetch(cls, scope: str) -> Self:
+        member = cls._value2member_map_.get(scope)
+        if member is None:
+            raise RuleTypeError(f"scope '{scope} is invalid'")
+        return member
 
 
 class Rule:
     type: RuleType
+    scope: RuleScope
     conditions: list[Condition]
 
-    def __init__(self, type: str, conditions: list) -> None:
+    def __init__(self, type: str, conditions: list, scope: str = "message") -> None:
         self.type = RuleType.fetch(type)
+        self.scope = RuleScope.fetch(scope)
         self.conditions = []
         self._set_conditions(conditions)
 
+    @property
+    def key(self) -> tuple:
+        conditions = sorted(
+            ((condition.is_negated, condition.key) for condition in self.conditions),
+            key=repr,
+        )
+        return (self.type, tuple(conditions))
+
     def _set_conditions(self, conditions: list):
         for condition in conditions:
             con = Condition(condition)
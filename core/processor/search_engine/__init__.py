@@ -1,7 +1,14 @@
-from typing import Protocol
+from typing import Iterator, Protocol
 
+from core.processor.condition import Condition
 from core.processor.rule import Rule
 
+CHUNK_SIZE = 2000
+
 
 class SearchEngine(Protocol):
-    def search(self, rule: Rule) -> list: ...
+    def search(self, rule: Rule) -> Iterator[list[str]]: ...
+
+    def match(self, condition: Condition) -> set[str]: ...
+
+    def all(self) -> set[str]: ...
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.processor.condition import Condition, ConditionType
+from core.processor.rule import Rule
+from core.processor.search_engine import CHUNK_SIZE, SearchEngine
+from core.utils import chunked
+
+DATA_VERSION_KEY = "email_op:data_version"
+DEFAULT_SEARCH_CACHE = {
+    "SIZE": 256,
+    "TIME_BUCKET": 60,
+    "ALIAS": "search",
+    "SHARE_RESULTS": False,
+    "MAX_RESULT_SIZE": 100_000,
+}
+
+
+def search_cache_settings() -> dict:
+    return {**DEFAULT_SEARCH_CACHE, **getattr(settings, "SEARCH_CACHE", {})}
+
+
+def data_version() -> int:
+    cache = caches[search_cache_settings()["ALIAS"]]
+    # a lost key is re-seeded from the clock so the version never goes back
+    cache.add(DATA_VERSION_KEY, time.time_ns(), timeout=None)
+    return cache.get(DATA_VERSION_KEY)
+
+
+def bump_data_version() -> int:
+    cache = caches[search_cache_settings()["ALIAS"]]
+    cache.add(DATA_VERSION_KEY, time.time_ns(), timeout=None)
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(DATA_VERSION_KEY, version, timeout=None)
+        return version
+
+
+def fingerprint(key: Any) -> str:
+    canonical = json.dumps(key, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+class SearchResultCache:
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        time_bucket: Optional[int] = None,
+        share_results: Optional[bool] = None,
+    ) -> None:
+        config = search_cache_settings()
+        self.size = config["SIZE"] if size is None else size
+        self.time_bucket = config["TIME_BUCKET"] if time_bucket is None else time_bucket
+        self.share_results = (
+            config["SHARE_RESULTS"] if share_results is None else share_results
+        )
+        self.max_result_size = config["MAX_RESULT_SIZE"]
+        self._alias = config["ALIAS"]
+        self._entries: OrderedDict[str, frozenset[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any, time_sensitive: bool) -> Optional[frozenset[str]]:
+        cache_key = self._cache_key(key, time_sensitive)
+        with self._lock:
+            if cache_key in self._entries:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return self._entries[cache_key]
+
+        result = None
+        if self.share_results:
+            result = caches[self._alias].get(cache_key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(cache_key, result)
+        return result
+
+    def put(self, key: Any, time_sensitive: bool, result: Iterable[str]) -> frozenset:
+        cache_key = self._cache_key(key, time_sensitive)
+        result = frozenset(result)
+        if self.share_results:
+            caches[self._alias].set(cache_key, result, timeout=None)
+        self._remember(cache_key, result)
+        return result
+
+    def get_or_compute(
+        self, key: Any, time_sensitive: bool, compute: Callable[[], Any]
+    ) -> frozenset[str]:
+        result = self.get(key, time_sensitive)
+        if result is None:
+            result = self.put(key, time_sensitive, compute())
+        return result
+
+    def _cache_key(self, key: Any, time_sensitive: bool) -> str:
+        bucket = int(time.time() // self.time_bucket) if time_sensitive else 0
+        return f"email_op:search:{fingerprint(key)}:{data_version()}:{bucket}"
+
+    def _remember(self, cache_key: str, result: frozenset[str]):
+        with self._lock:
+            self._entries[cache_key] = result
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+search_result_cache = SearchResultCache()
+
+
+class CachedSearchEngine:
+    def __init__(
+        self, search_engine: SearchEngine, cache: Optional[SearchResultCache] = None
+    ) -> None:
+        self._search_engine = search_engine
+        self._cache = search_result_cache if cache is None else cache
+        self._cacheable = getattr(search_engine, "CACHEABLE", False)
+
+    def compile_condition(self, condition: Condition):
+        compile_condition = getattr(self._search_engine, "compile_condition", None)
+        return None if compile_condition is None else compile_condition(condition)
+
+    def search(self, rule: Rule) -> Iterator[list[str]]:
+        if not self._cacheable:
+            yield from self._search_engine.search(rule)
+            return
+        key = ["rule", rule.key]
+        time_sensitive = any(c.type == ConditionType.DATETIME for c in rule.conditions)
+        result = self._cache.get(key, time_sensitive)
+        if result is not None:
+            yield from chunked(result, CHUNK_SIZE)
+            return
+
+        # results are streamed through, only those small enough are kept
+        collected: Optional[list[str]] = []
+        for chunk in self._search_engine.search(rule):
+            if collected is not None:
+                collected.extend(chunk)
+                if len(collected) > self._cache.max_result_size:
+                    collected = None
+            yield chunk
+        if collected is not None:
+            self._cache.put(key, time_sensitive, collected)
+
+    def match(self, condition: Condition) -> set[str]:
+        if not self._cacheable:
+            return self._search_engine.match(condition)
+        result = self._cache.get_or_compute(
+            ["condition", condition.key],
+            condition.type == ConditionType.DATETIME,
+            lambda: self._search_engine.match(condition),
+        )
+        return set(result)
+
+    def all(self) -> set[str]:
+        if not self._cacheable:
+            return self._search_engine.all()
+        return set(self._cache.get_or_compute(["all"], False, self._search_engine.all))
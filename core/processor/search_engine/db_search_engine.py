@@ -1,74 +1,237 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
 
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
+from django.db.models.lookups import Exact
 from django.utils import timezone
 
-from core.processor.condition import Condition, ConditionType
+from core.address import is_address, is_registrable_domain
+from core.metadata import label_mask
+from core.models import Recipient
+from core.processor.condition import (
+    KEYWORD_PREDICATES,
+    RECIPIENT_FIELDS,
+    REGEX_PREDICATES,
+    Condition,
+    ConditionType,
+)
+from core.processor.patterns import keywords_pattern, required_literals
 from core.processor.rule import Rule, RuleType
+from core.processor.search_engine import CHUNK_SIZE
+from core.utils import chunked
+
+
+class QueryFragment:
+    __slots__ = ("query", "lookup", "delta")
+
+    def __init__(
+        self,
+        query: Q | None = None,
+        lookup: str | None = None,
+        delta: timedelta | None = None,
+    ) -> None:
+        self.query = query
+        self.lookup = lookup
+        self.delta = delta
+
+    def resolve(self) -> Q:
+        if self.delta is None:
+            return self.query
+        return Q(**{self.lookup: timezone.now() - self.delta})
 
 
 class DBSearchEngine:
+    # results only change when a loader bumps the data version
+    CACHEABLE = True
     CONDITION_FIELDS_TO_DB_FIELDS = {
         "from": "from_email",
         "subject": "subject",
         "message": "message",
         "received": "received_at",
+        "to": "to_addresses",
+        "cc": "cc_addresses",
+        "size": "size_estimate",
+        "attachments": "attachment_count",
+        "attachment_size": "attachment_bytes",
+        "labels": "label_bits",
     }
     PREDICATE_DB_FILTER_MAPPINGS = {
         "contains": "icontains",
         "not_contains": "icontains",
         "equals": "iexact",
         "not_equals": "iexact",
+        "matches_regex": "iregex",
+        "not_matches_regex": "iregex",
+        "contains_any": "iregex",
+        "not_contains_any": "iregex",
+        "less_than": "lt",
+        "greater_than": "gt",
+    }
+    # a LIKE per alternative costs more than it saves past a few of them
+    MAX_PREFILTER_ALTERNATIVES = 8
+    NUMBER_DB_FILTER_MAPPINGS = {
         "less_than": "lt",
         "greater_than": "gt",
+        "equals": "exact",
+        "not_equals": "exact",
     }
 
-    STRING_PREDICATES = ["contains", "not_contains", "equals", "not_equals"]
+    STRING_PREDICATES = [
+        "contains",
+        "not_contains",
+        "equals",
+        "not_equals",
+        *REGEX_PREDICATES,
+        *KEYWORD_PREDICATES,
+    ]
     DATETIME_PREDICATES = ["less_than", "greater_than"]
 
-    def __init__(self, model: type[models.Model]):
+    def __init__(self, model: type[models.Model], chunk_size: int = CHUNK_SIZE):
         self._model = model
+        self._chunk_size = chunk_size
 
-    def search(self, rule: Rule):
+    def search(self, rule: Rule) -> Iterator[list[str]]:
+        msg_ids = (
+            self.queryset(rule)
+            .values_list("msg_id", flat=True)
+            .iterator(chunk_size=self._chunk_size)
+        )
+        yield from chunked(msg_ids, self._chunk_size)
+
+    def queryset(self, rule: Rule) -> models.QuerySet:
         negation_query = Q()
         query = Q()
-        if rule.type == RuleType.ALL:
-            for condition in rule.conditions:
-                if condition.type == ConditionType.STRING:
-                    q = self.build_string_query(condition)
-                else:
-                    q = self.build_datetime_query(condition)
-                if "not" in condition.predicate:
-                    negation_query &= q
-                else:
-                    query &= q
-        else:
-            for condition in rule.conditions:
-                if condition.type == ConditionType.STRING:
-                    q = self.build_string_query(condition)
-                else:
-                    q = self.build_datetime_query(condition)
-                if "not" in condition.predicate:
-                    negation_query &= q
-                else:
-                    query |= q
-        return list(
-            self._model.objects.filter(query)
-            .exclude(negation_query)
-            .values_list("msg_id", flat=True)
+        for condition in rule.conditions:
+            q = self.build_query(condition)
+            if condition.is_negated:
+                negation_query &= q
+            elif rule.type == RuleType.ALL:
+                query &= q
+            else:
+                query |= q
+        return self._model.objects.filter(query).exclude(negation_query)
+
+    def stream(
+        self,
+        rule: Rule,
+        fields: list[str],
+        page_size: int = 500,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> Iterator[dict]:
+        queryset = self.queryset(rule).order_by("-received_at", "-id")
+        columns = list(dict.fromkeys([*fields, "received_at", "id"]))
+        while True:
+            page = queryset
+            if after is not None:
+                received_at, pk = after
+                page = page.filter(
+                    Q(received_at__lt=received_at)
+                    | Q(received_at=received_at, id__lt=pk)
+                )
+            rows = list(page.values(*columns)[:page_size])
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after = (rows[-1]["received_at"], rows[-1]["id"])
+
+    def match(self, condition: Condition) -> set[str]:
+        return set(
+            self._model.objects.filter(self.build_query(condition)).values_list(
+                "msg_id", flat=True
+            )
         )
 
+    def all(self) -> set[str]:
+        return set(self._model.objects.values_list("msg_id", flat=True))
+
+    def build_query(self, condition: Condition) -> Q:
+        fragment = getattr(condition, "fragment", None)
+        if fragment is None:
+            fragment = self.compile_condition(condition)
+        return fragment.resolve()
+
+    def compile_condition(self, condition: Condition) -> QueryFragment:
+        if condition.type == ConditionType.NUMBER:
+            return QueryFragment(query=self.build_number_query(condition))
+        if condition.field == "labels":
+            return QueryFragment(query=self.build_label_query(condition))
+        if condition.type == ConditionType.STRING:
+            return QueryFragment(query=self.build_string_query(condition))
+        return QueryFragment(
+            lookup=self.build_lookup(condition),
+            delta=timedelta(**{condition.filter: int(condition.value)}),
+        )
+
+    def build_lookup(self, condition: Condition) -> str:
+        field = self.CONDITION_FIELDS_TO_DB_FIELDS[condition.field]
+        return f"{field}__{self.PREDICATE_DB_FILTER_MAPPINGS[condition.predicate]}"
+
     def build_string_query(self, condition: Condition) -> Q:
-        query_str = {
-            f"{self.CONDITION_FIELDS_TO_DB_FIELDS[condition.field]}__{self.PREDICATE_DB_FILTER_MAPPINGS[condition.predicate]}": condition.value
-        }
-        return Q(**query_str)
+        if condition.predicate in REGEX_PREDICATES:
+            return self.build_regex_query(condition)
+        if condition.predicate in KEYWORD_PREDICATES:
+            return self.build_keywords_query(condition)
+        if condition.field == "from":
+            q = self.build_sender_query(condition)
+            if q is not None:
+                return q
+        if condition.field in RECIPIENT_FIELDS:
+            return self.build_recipient_query(condition)
+        return Q(**{self.build_lookup(condition): condition.value})
+
+    def build_recipient_query(self, condition: Condition) -> Q:
+        if condition.predicate not in ("equals", "not_equals"):
+            return Q(**{self.build_lookup(condition): condition.value})
+        # equals means one of the addresses, looked up in the recipient index
+        recipients = Recipient.objects.filter(
+            kind=condition.field, address=str(condition.value).strip().lower()
+        )
+        return Q(pk__in=recipients.values("email_id"))
+
+    def build_number_query(self, condition: Condition) -> Q:
+        field = self.CONDITION_FIELDS_TO_DB_FIELDS[condition.field]
+        lookup = self.NUMBER_DB_FILTER_MAPPINGS[condition.predicate]
+        return Q(**{f"{field}__{lookup}": int(condition.value)})
+
+    def build_label_query(self, condition: Condition) -> Q:
+        mask = label_mask(str(condition.value))
+        return Q(Exact(F("label_bits").bitand(mask), mask))
+
+    def build_regex_query(self, condition: Condition) -> Q:
+        field = self.CONDITION_FIELDS_TO_DB_FIELDS[condition.field]
+        return self.build_pattern_query(field, str(condition.value))
+
+    def build_keywords_query(self, condition: Condition) -> Q:
+        # one regex pass instead of one LIKE per keyword
+        field = self.CONDITION_FIELDS_TO_DB_FIELDS[condition.field]
+        return self.build_pattern_query(field, keywords_pattern(condition.value))
+
+    def build_pattern_query(self, field: str, pattern: str) -> Q:
+        # required literals narrow the rows with cheap LIKEs before the regex
+        # runs, unless there are too many alternatives to be cheap
+        alternatives = required_literals(pattern) or []
+        if len(alternatives) > self.MAX_PREFILTER_ALTERNATIVES:
+            alternatives = []
+        prefilter = Q()
+        for literals in alternatives:
+            alternative = Q()
+            for literal in literals:
+                alternative &= Q(**{f"{field}__icontains": literal})
+            prefilter |= alternative
+        return prefilter & Q(**{f"{field}__iregex": pattern})
+
+    def build_sender_query(self, condition: Condition) -> Q | None:
+        # a substring of the header is not a substring of its parsed parts,
+        # only exact matches can be answered by the sender columns
+        if condition.predicate not in ("equals", "not_equals"):
+            return None
+        value = str(condition.value).strip().lower()
+        if is_address(value):
+            return Q(sender_address=value)
+        if is_registrable_domain(value):
+            return Q(sender_domain=value.lstrip("@"))
+        return None
 
     def build_datetime_query(self, condition: Condition) -> Q:
-        delta = {f"{condition.filter}": int(condition.value)}
-        q = timezone.now() - timedelta(**delta)
-        query_str = {
-            f"{self.CONDITION_FIELDS_TO_DB_FIELDS[condition.field]}__{self.PREDICATE_DB_FILTER_MAPPINGS[condition.predicate]}": q
-        }
-        return Q(**query_str)
+        return self.compile_condition(condition).resolve()
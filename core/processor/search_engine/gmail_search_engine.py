@@ -0,0 +1,297 @@
+import os.path
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional
+
+from core.address import is_address
+from core.metadata import address_list, label_bits
+from core.processor.condition import (
+    KEYWORD_PREDICATES,
+    NEGATED_PREDICATES,
+    REGEX_PREDICATES,
+    Condition,
+    ConditionType,
+)
+from core.processor.exception import PushdownError, SearchError
+from core.processor.matching import matches
+from core.processor.patterns import normalize_keywords
+from core.processor.rule import Rule, RuleType
+from core.profiling import stage
+
+SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+FIELD_OPERATORS = {
+    "from": "from:",
+    "to": "to:",
+    "cc": "cc:",
+    "subject": "subject:",
+    "message": "",
+}
+METADATA_FIELDS = ["from", "to", "cc", "subject", "received", "size", "labels"]
+METADATA_HEADERS = {
+    "From": "from_email",
+    "To": "to_addresses",
+    "Cc": "cc_addresses",
+    "Subject": "subject",
+}
+LABEL_TERMS = {
+    "INBOX": "in:inbox",
+    "UNREAD": "is:unread",
+    "STARRED": "is:starred",
+    "IMPORTANT": "is:important",
+    "SENT": "in:sent",
+    "DRAFT": "in:draft",
+    "SPAM": "in:spam",
+    "TRASH": "in:trash",
+    "CATEGORY_PERSONAL": "category:primary",
+    "CATEGORY_SOCIAL": "category:social",
+    "CATEGORY_PROMOTIONS": "category:promotions",
+    "CATEGORY_UPDATES": "category:updates",
+    "CATEGORY_FORUMS": "category:forums",
+}
+# predicates matching parts of words, which Gmail's word search can not narrow
+SUBSTRING_PREDICATES = ["contains", "not_contains", *KEYWORD_PREDICATES]
+GMAIL_BATCH_LIMIT = 100
+
+
+@dataclass
+class GmailQuery:
+    q: str
+    rule_type: RuleType
+    check_positives: list = field(default_factory=list)
+    check_negations: list = field(default_factory=list)
+
+    @property
+    def needs_post_filter(self) -> bool:
+        return bool(self.check_positives or self.check_negations)
+
+    def accepts(self, email: dict) -> bool:
+        if self.check_positives:
+            results = (matches(c, email) for c in self.check_positives)
+            if not (all(results) if self.rule_type == RuleType.ALL else any(results)):
+                return False
+        if self.check_negations:
+            return not all(matches(c, email) for c in self.check_negations)
+        return True
+
+
+class GmailSearchEngine:
+    def __init__(self, model: Any = None, service: Any = None) -> None:
+        self._service = service
+        self._creds = None
+        self.last_query: Optional[GmailQuery] = None
+
+    def search(self, rule: Rule) -> Iterator[list[str]]:
+        query = self.translate(rule)
+        self.last_query = query
+        for msg_ids in self._list_pages(query.q):
+            if query.needs_post_filter:
+                msg_ids = [
+                    msg_id
+                    for msg_id, email in self._fetch_metadata(msg_ids)
+                    if query.accepts(email)
+                ]
+            if msg_ids:
+                yield msg_ids
+
+    def match(self, condition: Condition) -> set[str]:
+        positive = {
+            "field": condition.field,
+            "predicate": NEGATED_PREDICATES.get(
+                condition.predicate, condition.predicate
+            ),
+            "value": condition.value,
+            "type": condition.type,
+            "filter": condition.filter,
+        }
+        rule = Rule(RuleType.ALL, [positive])
+        return {msg_id for msg_ids in self.search(rule) for msg_id in msg_ids}
+
+    def all(self) -> set[str]:
+        return {msg_id for msg_ids in self._list_pages("") for msg_id in msg_ids}
+
+    def translate(self, rule: Rule) -> GmailQuery:
+        positives = [c for c in rule.conditions if not c.is_negated]
+        negations = [c for c in rule.conditions if c.is_negated]
+        query = GmailQuery("", rule.type)
+        terms = []
+
+        positive_terms = [self.build_term(c) for c in positives]
+        inexact = [c for c, (_, exact) in zip(positives, positive_terms) if not exact]
+        if rule.type == RuleType.ALL:
+            terms.extend(term for term, _ in positive_terms if term)
+            query.check_positives = inexact
+        elif not all(term for term, _ in positive_terms):
+            # a condition Gmail cannot narrow at all leaves the whole group open
+            query.check_positives = positives
+        elif positive_terms:
+            terms.append(self._group("{", [term for term, _ in positive_terms], "}"))
+            query.check_positives = positives if inexact else []
+
+        negation_terms = [self.build_term(c) for c in negations]
+        if all(exact for _, exact in negation_terms):
+            if negation_terms:
+                group = self._group("(", [term for term, _ in negation_terms], ")")
+                terms.append(f"-{group}")
+        else:
+            query.check_negations = negations
+
+        unsupported = [
+            c
+            for c in [*query.check_positives, *query.check_negations]
+            if c.field not in METADATA_FIELDS
+        ]
+        if unsupported:
+            raise PushdownError(
+                "cannot push down or post-filter "
+                + ", ".join(f"{c.field} {c.predicate} {c.value!r}" for c in unsupported)
+            )
+        query.q = " ".join(terms)
+        return query
+
+    def build_term(self, condition: Condition) -> tuple[str, bool]:
+        if condition.type == ConditionType.DATETIME:
+            operator = (
+                "older_than" if condition.predicate == "less_than" else "newer_than"
+            )
+            return f"{operator}:{int(condition.value)}d", True
+        if condition.type == ConditionType.NUMBER:
+            return self.build_number_term(condition)
+        if condition.field == "labels":
+            return LABEL_TERMS[str(condition.value).strip().upper()], True
+        if condition.predicate in REGEX_PREDICATES:
+            return "", False
+        if condition.field != "message" and condition.predicate in SUBSTRING_PREDICATES:
+            # Gmail matches whole words, a term could drop substring matches,
+            # headers are matched in memory instead
+            return "", False
+        if condition.predicate in KEYWORD_PREDICATES:
+            keywords = normalize_keywords(condition.value)
+            terms = [self._phrase(condition, keyword) for keyword in keywords]
+            return self._group("{", terms, "}"), not condition.is_negated
+        term = self._phrase(condition, condition.value)
+        if condition.predicate in ("contains", "not_contains"):
+            # bodies are not fetched, Gmail's word match is the closest check;
+            # excluding by it could drop messages that contain the value
+            return term, not condition.is_negated
+        is_exact_address = condition.field in ("from", "to", "cc") and is_address(
+            str(condition.value)
+        )
+        return term, is_exact_address
+
+    def build_number_term(self, condition: Condition) -> tuple[str, bool]:
+        value = int(condition.value)
+        if condition.field == "attachments":
+            if (condition.predicate, value) in (("greater_than", 0), ("equals", 0)):
+                sign = "" if condition.predicate == "greater_than" else "-"
+                return f"{sign}has:attachment", True
+            return "", False
+        # Gmail compares its own size estimate, the exact bound is post-filtered
+        if condition.field == "size" and condition.predicate == "greater_than":
+            return f"larger:{value}", False
+        if condition.field == "size" and condition.predicate == "less_than":
+            return f"smaller:{value}", False
+        return "", False
+
+    @staticmethod
+    def _phrase(condition: Condition, value: str) -> str:
+        value = " ".join(str(value).replace('"', " ").split())
+        return f'{FIELD_OPERATORS[condition.field]}"{value}"'
+
+    @staticmethod
+    def _group(start: str, terms: list[str], end: str) -> str:
+        return terms[0] if len(terms) == 1 else f"{start}{' '.join(terms)}{end}"
+
+    def _list_pages(self, q: str) -> Iterator[list[str]]:
+        page_token = None
+        while True:
+            request = (
+                self.service.users()
+                .messages()
+                .list(userId="me", q=q, pageToken=page_token, maxResults=500)
+            )
+            with stage("list"):
+                response = request.execute()
+            yield [message["id"] for message in response.get("messages", [])]
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+
+    def _fetch_metadata(self, msg_ids: list[str]) -> Iterator[tuple[str, dict]]:
+        for start in range(0, len(msg_ids), GMAIL_BATCH_LIMIT):
+            responses, errors = {}, {}
+
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    errors[request_id] = exception
+                else:
+                    responses[request_id] = response
+
+            bt = self.service.new_batch_http_request(callback=callback)
+            for msg_id in msg_ids[start : start + GMAIL_BATCH_LIMIT]:
+                bt.add(
+                    self.service.users()
+                    .messages()
+                    .get(
+                        userId="me",
+                        id=msg_id,
+                        format="metadata",
+                        metadataHeaders=list(METADATA_HEADERS),
+                    ),
+                    request_id=msg_id,
+                )
+            with stage("fetch"):
+                bt.execute()
+            # a message that can not be checked can not be left out silently
+            if errors:
+                raise SearchError(
+                    "cannot fetch metadata of "
+                    + ", ".join(
+                        f"{msg_id}: {error}" for msg_id, error in errors.items()
+                    )
+                )
+            for msg_id in msg_ids[start : start + GMAIL_BATCH_LIMIT]:
+                yield msg_id, self._metadata_to_email(responses[msg_id])
+
+    @staticmethod
+    def _metadata_to_email(response: dict) -> dict:
+        email = {
+            "received_at": datetime.fromtimestamp(
+                int(response["internalDate"]) / 1000, tz=timezone.utc
+            ),
+            "size_estimate": response.get("sizeEstimate", 0),
+            "label_bits": label_bits(response.get("labelIds", [])),
+        }
+        for header in response.get("payload", {}).get("headers", []):
+            if header["name"] in METADATA_HEADERS:
+                email[METADATA_HEADERS[header["name"]]] = header["value"]
+        for key in ("to_addresses", "cc_addresses"):
+            email[key] = address_list(email.get(key))
+        return email
+
+    @property
+    def service(self) -> Any:
+        if self._service is None:
+            from googleapiclient.discovery import build
+
+            with stage("auth"):
+                self._authenticate()
+            self._service = build("gmail", "v1", credentials=self._creds)
+        return self._service
+
+    def _authenticate(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        if os.path.exists("token.json"):
+            self._creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+        if not self._creds or not self._creds.valid:
+            if self._creds and self._creds.expired and self._creds.refresh_token:
+                self._creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    "credentials.json", SCOPES
+                )
+                self._creds = flow.run_local_server(port=0)
+            with open("token.json", "w") as token:
+                token.write(self._creds.to_json())
@@ -0,0 +1,247 @@
+"""Per stage profiling for the load and process commands.
+
+Code marks a stage with ``with stage("fetch"):``. Without an active
+``Profiler`` that is a global lookup and a no-op context manager, so stages are
+left in hot paths. Times are inclusive of nested stages; peak memory is the
+highest traced allocation above what was allocated when the stage started.
+"""
+
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+PROFILE_FORMATS = ["table", "json"]
+NULL_STAGE = nullcontext()
+_DONE = object()
+
+_active: Optional["Profiler"] = None
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_memory: int = 0
+
+    def merge(self, other: "StageStats") -> "StageStats":
+        self.calls += other.calls
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.peak_memory = max(self.peak_memory, other.peak_memory)
+        return self
+
+
+class _Frame:
+    __slots__ = ("start_memory", "peak")
+
+    def __init__(self, start_memory: int, peak: int) -> None:
+        self.start_memory = start_memory
+        self.peak = peak
+
+
+class Profiler:
+    def __init__(
+        self, trace_memory: bool = True, dump_dir: Optional[str] = None
+    ) -> None:
+        self.stats: dict[str, StageStats] = {}
+        self._trace_memory = trace_memory
+        self._started_tracing = False
+        self._dump_dir = Path(dump_dir) if dump_dir else None
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._profile_stack: list[cProfile.Profile] = []
+        self._owner = threading.get_ident()
+        self._frames: set[_Frame] = set()
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self.wall = 0.0
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> "Profiler":
+        global _active
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._started = time.perf_counter()
+        _active = self
+        return self
+
+    def stop(self) -> None:
+        global _active
+        if _active is self:
+            _active = None
+        self.wall = time.perf_counter() - self._started
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if self._dump_dir is not None:
+            self._dump_dir.mkdir(parents=True, exist_ok=True)
+            for name, profile in self._profiles.items():
+                profile.dump_stats(self._dump_dir / f"{name}.prof")
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        frame = self._enter_memory()
+        profile = self._enter_profile(name)
+        cpu, wall = time.thread_time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            self._exit_profile(profile)
+            peak = self._exit_memory(frame)
+            with self._lock:
+                self.stats.setdefault(name, StageStats()).merge(
+                    StageStats(1, wall, cpu, peak)
+                )
+
+    def merge(self, stats: dict[str, StageStats]) -> None:
+        with self._lock:
+            for name, other in stats.items():
+                self.stats.setdefault(name, StageStats()).merge(other)
+
+    def _enter_memory(self) -> Optional[_Frame]:
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            current = self._observe_peak()
+            frame = _Frame(current, current)
+            self._frames.add(frame)
+            return frame
+
+    def _exit_memory(self, frame: Optional[_Frame]) -> int:
+        if frame is None or not tracemalloc.is_tracing():
+            return 0
+        with self._lock:
+            self._observe_peak()
+            self._frames.discard(frame)
+            return frame.peak - frame.start_memory
+
+    def _observe_peak(self) -> int:
+        # the traced peak is global, hand it to every open stage before resetting
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._frames:
+            frame.peak = max(frame.peak, peak)
+        tracemalloc.reset_peak()
+        return current
+
+    def _enter_profile(self, name: str) -> Optional[cProfile.Profile]:
+        # cProfile hooks a single thread, worker thread stages are not dumped
+        if self._dump_dir is None or threading.get_ident() != self._owner:
+            return None
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        if self._profile_stack:
+            self._profile_stack[-1].disable()
+        self._profile_stack.append(profile)
+        profile.enable()
+        return profile
+
+    def _exit_profile(self, profile: Optional[cProfile.Profile]) -> None:
+        if profile is None:
+            return
+        profile.disable()
+        self._profile_stack.pop()
+        if self._profile_stack:
+            self._profile_stack[-1].enable()
+
+    def report(self) -> dict:
+        return {
+            "wall": self.wall,
+            "stages": {name: asdict(stats) for name, stats in self.stats.items()},
+        }
+
+    def table(self) -> str:
+        lines = [
+            f"{'stage':<16}{'calls':>10}{'wall s':>11}{'cpu s':>11}{'peak MiB':>11}"
+        ]
+        for name, stats in sorted(
+            self.stats.items(), key=lambda item: item[1].wall, reverse=True
+        ):
+            lines.append(
+                f"{name:<16}{stats.calls:>10}{stats.wall:>11.3f}{stats.cpu:>11.3f}"
+                f"{stats.peak_memory / 2**20:>11.1f}"
+            )
+        lines.append(f"{'total':<16}{'':>10}{self.wall:>11.3f}")
+        return "\n".join(lines)
+
+
+def active() -> Optional[Profiler]:
+    return _active
+
+
+def stage(name: str):
+    profiler = _active
+    if profiler is None:
+        return NULL_STAGE
+    return profiler.stage(name)
+
+
+def timed(name: str, iterable: Iterable) -> Iterator:
+    """Yield from ``iterable``, counting the time spent producing each item."""
+    if _active is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+def profiled(
+    enabled: bool, func: Callable, *args: Any
+) -> tuple[Any, Optional[dict[str, StageStats]]]:
+    """Run ``func`` in a pool worker, profiling it when ``enabled``.
+
+    Process pool workers have no profiler of their own; the stats are returned
+    with the result so the parent can merge them.
+    """
+    if not enabled:
+        return func(*args), None
+    with Profiler(trace_memory=True) as profiler:
+        result = func(*args)
+    return result, profiler.stats
+
+
+def add_profile_arguments(parser) -> None:
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="table",
+        choices=PROFILE_FORMATS,
+        help="Record time, CPU, peak memory and calls per stage",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="DIR",
+        help="With --profile, write cProfile stats of each stage to DIR",
+    )
+
+
+@contextmanager
+def profile_command(options: dict, stdout) -> Iterator[Optional[Profiler]]:
+    if not options.get("profile"):
+        yield None
+        return
+    profiler = Profiler(dump_dir=options.get("profile_dump"))
+    try:
+        with profiler:
+            yield profiler
+    finally:
+        if options["profile"] == "json":
+            stdout.write(json.dumps(profiler.report(), indent=2))
+        else:
+            stdout.write(profiler.table())
@@ -0,0 +1,45 @@
+import functools
+from importlib.metadata import entry_points
+from typing import Any, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from core.processor.exception import BackendError
+
+BACKENDS = {
+    "search_engine": {
+        "db": "core.processor.search_engine.db_search_engine.DBSearchEngine",
+        "gmail": "core.processor.search_engine.gmail_search_engine.GmailSearchEngine",
+    },
+    "executor": {
+        "gmail": "core.processor.process_executor.gmail_executor.GmailProcessExecutor",
+    },
+    "loader": {
+        "gmail": "loader.loaders.GmailLoader",
+        "file": "loader.loaders.FileLoader",
+    },
+}
+DEFAULT_BACKENDS = {"search_engine": "db", "executor": "gmail", "loader": "gmail"}
+ENTRY_POINT_GROUP = "email_op.{kind}"
+
+
+def default_backend(kind: str) -> str:
+    configured = getattr(settings, "EMAIL_OP_BACKENDS", {})
+    return configured.get(kind, DEFAULT_BACKENDS[kind])
+
+
+@functools.cache
+def get_backend(kind: str, name: Optional[str] = None) -> Any:
+    if kind not in BACKENDS:
+        raise BackendError(f"unknown backend kind '{kind}'")
+    name = name or default_backend(kind)
+    if name in BACKENDS[kind]:
+        return import_string(BACKENDS[kind][name])
+    if "." in name:
+        return import_string(name)
+    # entry points are only scanned when a backend is not built in
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP.format(kind=kind)):
+        if entry_point.name == name:
+            return entry_point.load()
+    raise BackendError(f"{kind} backend '{name}' is not registered")
@@ -0,0 +1,56 @@
+from core.models import Email
+from core.processor.rule import Rule
+from core.processor.search_engine.cache import (
+    CachedSearchEngine,
+    SearchResultCache,
+    bump_data_version,
+    data_version,
+)
+from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.tests.conftest import create_email, search_ids
+
+RULE = {
+    "field": "subject",
+    "predicate": "contains",
+    "value": "developer",
+    "type": "string",
+}
+
+
+class TestCachedSearchEngine:
+    def test_repeat_search_skips_database(
+        self, emails, django_assert_num_queries
+    ) -> None:
+        engine = CachedSearchEngine(DBSearchEngine(Email), SearchResultCache())
+        with django_assert_num_queries(1):
+            first = search_ids(engine, Rule("all", [RULE]))
+            second = search_ids(engine, Rule("all", [{**RULE, "value": "DEVELOPER"}]))
+        assert sorted(first) == sorted(second) == ["1", "3"]
+
+    def test_different_values_are_not_served_from_cache(self, emails) -> None:
+        engine = CachedSearchEngine(DBSearchEngine(Email), SearchResultCache())
+        search_ids(engine, Rule("all", [RULE]))
+        assert search_ids(engine, Rule("all", [{**RULE, "value": " Developer"}])) == []
+
+    def test_bumped_data_version_invalidates(self, emails) -> None:
+        cache = SearchResultCache()
+        engine = CachedSearchEngine(DBSearchEngine(Email), cache)
+        search_ids(engine, Rule("all", [RULE]))
+        create_email("5", "dev@example.com", "developer role")
+        assert sorted(search_ids(engine, Rule("all", [RULE]))) == ["1", "3"]
+
+        bump_data_version()
+        assert sorted(search_ids(engine, Rule("all", [RULE]))) == ["1", "3", "5"]
+        assert cache.misses == 2
+
+    def test_data_version_is_monotonic(self) -> None:
+        version = data_version()
+        assert bump_data_version() > version
+
+    def test_lru_eviction(self) -> None:
+        cache = SearchResultCache(size=2)
+        for key in ["a", "b", "a", "c"]:
+            cache.get_or_compute([key], False, lambda: {key})
+        cache.get_or_compute(["a"], False, lambda: set())
+        assert cache.hits == 2
+        assert cache.misses == 3
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from core.address import parse_sender
+from core.models import Email
+
+
+def create_email(
+    msg_id: str,
+    from_email: str,
+    subject: str = "",
+    days_ago: int = 0,
+    thread_id: str = "",
+):
+    sender_name, sender_address, sender_domain = parse_sender(from_email)
+    return Email.objects.create(
+        msg_id=msg_id,
+        thread_id=thread_id,
+        from_email=from_email,
+        sender_name=sender_name,
+        sender_address=sender_address,
+        sender_domain=sender_domain,
+        subject=subject,
+        message="",
+        received_at=timezone.now() - timedelta(days=days_ago),
+    )
+
+
+def search_ids(search_engine, rule) -> list[str]:
+    return [msg_id for chunk in search_engine.search(rule) for msg_id in chunk]
+
+
+@pytest.fixture
+def emails(db):
+    return [
+        create_email("1", "LinkedIn <jobs-noreply@linkedin.com>", "developer jobs"),
+        create_email("2", "LinkedIn <news@mail.linkedin.com>", "weekly digest", 5),
+        create_email("3", "Posted via LinkedIn <alerts@example.co.uk>", "developer"),
+        create_email("4", "someone@example.com", "hello", 3),
+    ]
@@ -0,0 +1,201 @@
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+QUERY_TOKEN_PATTERN = re.compile(r'-?[({]|[)}]|-?(?:[a-z_]+:)?(?:"[^"]*"|[^\s(){}"]+)')
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def parse_query(q: str):
+    tokens = QUERY_TOKEN_PATTERN.findall(q)
+    position = 0
+
+    def sequence(end=None):
+        nonlocal position
+        terms = []
+        while position < len(tokens) and tokens[position] != end:
+            terms.append(term())
+        position += 1
+        return terms
+
+    def term():
+        nonlocal position
+        token = tokens[position]
+        position += 1
+        negate = token.startswith("-")
+        token = token.lstrip("-")
+        if token == "(":
+            node = ("all", sequence(")"))
+        elif token == "{":
+            node = ("any", sequence("}"))
+        else:
+            operator, _, value = token.rpartition(":")
+            node = (operator or "text", value.strip('"').lower())
+        return ("not", node) if negate else node
+
+    return ("all", sequence())
+
+
+def evaluate_query(node, message: dict) -> bool:
+    kind, value = node
+    if kind == "not":
+        return not evaluate_query(value, message)
+    if kind == "all":
+        return all(evaluate_query(child, message) for child in value)
+    if kind == "any":
+        return any(evaluate_query(child, message) for child in value)
+    if kind in ("older_than", "newer_than"):
+        cutoff = datetime.now(timezone.utc) - timedelta(days=int(value[:-1]))
+        if kind == "older_than":
+            return message["received_at"] < cutoff
+        return message["received_at"] > cutoff
+    if kind in ("larger", "smaller"):
+        size = message.get("size", 0)
+        return size > int(value) if kind == "larger" else size < int(value)
+    if kind in ("is", "in"):
+        return value.upper() in message.get("labels", [])
+    if kind == "text":
+        fields = ["from", "subject", "body"]
+    else:
+        fields = [kind]
+    return any(contains_phrase(message.get(field, ""), value) for field in fields)
+
+
+def contains_phrase(text: str, phrase: str) -> bool:
+    # like Gmail, a term only matches whole words: "ample" is not in "example"
+    words = WORD_PATTERN.findall(text.lower())
+    phrase_words = WORD_PATTERN.findall(phrase.lower())
+    size = len(phrase_words)
+    return any(
+        words[start : start + size] == phrase_words
+        for start in range(len(words) - size + 1)
+    )
+
+
+class FakeRequest:
+    def __init__(self, service, method: str, **kwargs) -> None:
+        self.service = service
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self):
+        return self.service.handle(self.method, self.kwargs)
+
+
+class FakeBatch:
+    def __init__(self, service, callback) -> None:
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request: FakeRequest, callback=None, request_id=None):
+        request_id = request_id or str(len(self._requests) + 1)
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        # latency stands in for the round trip of one batch request
+        time.sleep(self._service.latency)
+        if self._service.batch_error is not None:
+            raise self._service.batch_error
+        self._service.batches.append(len(self._requests))
+        for request_id, request in self._requests:
+            try:
+                response, exception = request.execute(), None
+            except Exception as error:
+                response, exception = None, error
+            self._callback(request_id, response, exception)
+
+
+class FakeResource:
+    def __init__(self, service, kind: str) -> None:
+        self._service = service
+        self._kind = kind
+
+    def messages(self):
+        return FakeResource(self._service, "messages")
+
+    def threads(self):
+        return FakeResource(self._service, "threads")
+
+    def modify(self, **kwargs):
+        return FakeRequest(self._service, f"{self._kind}.modify", **kwargs)
+
+    def list(self, **kwargs):
+        return FakeRequest(self._service, f"{self._kind}.list", **kwargs)
+
+    def get(self, **kwargs):
+        return FakeRequest(self._service, f"{self._kind}.get", **kwargs)
+
+
+class FakeGmailService:
+    def __init__(
+        self,
+        failing_ids: set[str] | None = None,
+        messages: dict[str, dict] | None = None,
+        page_size: int = 2,
+        latency: float = 0,
+        batch_error: Exception | None = None,
+        transient_errors: dict[str, list[Exception]] | None = None,
+    ) -> None:
+        self.failing_ids = failing_ids or set()
+        self.messages = messages or {}
+        self.page_size = page_size
+        self.latency = latency
+        self.batch_error = batch_error
+        # errors raised for an id one after another before it succeeds
+        self.transient_errors = transient_errors or {}
+        self.threads: set[int] = set()
+        self.calls: list[tuple[str, dict]] = []
+        self.batches: list[int] = []
+
+    def users(self):
+        return FakeResource(self, "users")
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def handle(self, method: str, kwargs: dict):
+        self.threads.add(threading.get_ident())
+        if kwargs.get("id") in self.failing_ids:
+            raise RuntimeError(f"{method} failed for {kwargs['id']}")
+        if self.transient_errors.get(kwargs.get("id")):
+            raise self.transient_errors[kwargs["id"]].pop(0)
+        self.calls.append((method, kwargs))
+        if method == "messages.list":
+            return self._list(kwargs.get("q", ""), kwargs.get("pageToken"))
+        if method == "messages.get":
+            return self._get(kwargs["id"])
+        return {"id": kwargs.get("id")}
+
+    def _list(self, q: str, page_token: str | None) -> dict:
+        query = parse_query(q)
+        ids = [
+            msg_id
+            for msg_id, message in self.messages.items()
+            if evaluate_query(query, message)
+        ]
+        start = int(page_token or 0)
+        response = {
+            "messages": [
+                {"id": msg_id} for msg_id in ids[start : start + self.page_size]
+            ]
+        }
+        if start + self.page_size < len(ids):
+            response["nextPageToken"] = str(start + self.page_size)
+        return response
+
+    def _get(self, msg_id: str) -> dict:
+        message = self.messages[msg_id]
+        return {
+            "id": msg_id,
+            "sizeEstimate": message.get("size", 0),
+            "labelIds": message.get("labels", []),
+            "internalDate": str(int(message["received_at"].timestamp() * 1000)),
+            "payload": {
+                "headers": [
+                    {"name": "From", "value": message["from"]},
+                    {"name": "Subject", "value": message["subject"]},
+                ]
+            },
+        }
@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.processor.exception import PushdownError, SearchError
+from core.processor.rule import Rule
+from core.processor.search_engine.gmail_search_engine import GmailSearchEngine
+from core.tests.conftest import search_ids
+from core.tests.fake_gmail import FakeGmailService
+
+
+def condition(field: str, predicate: str, value: str) -> dict:
+    return {"field": field, "predicate": predicate, "value": value, "type": "string"}
+
+
+def message(sender: str, subject: str, days_ago: int = 0, body: str = "") -> dict:
+    received_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    return {
+        "from": sender,
+        "subject": subject,
+        "received_at": received_at,
+        "body": body,
+    }
+
+
+RECEIVED_OLDER_THAN_2_DAYS = {
+    "field": "received",
+    "predicate": "less_than",
+    "value": "2",
+    "filter": "days",
+    "type": "datetime",
+}
+
+
+@pytest.fixture
+def service() -> FakeGmailService:
+    return FakeGmailService(
+        messages={
+            "1": message("LinkedIn <jobs@linkedin.com>", "developer jobs"),
+            "2": message("LinkedIn <news@linkedin.com>", "Developer", 5),
+            "3": message("someone@example.com", "developer meetup", 3, "linkedin"),
+            "4": message("someone@example.com", "hello", 1, "click to unsubscribe"),
+        }
+    )
+
+
+class TestGmailSearchEngine:
+    def test_translate(self) -> None:
+        rule = Rule(
+            "all",
+            [
+                condition("from", "equals", "jobs@linkedin.com"),
+                condition("subject", "not_contains", 'say "hi"'),
+                condition("message", "contains", "unsubscribe"),
+                RECEIVED_OLDER_THAN_2_DAYS,
+            ],
+        )
+        query = GmailSearchEngine(service=FakeGmailService()).translate(rule)
+        assert query.q == 'from:"jobs@linkedin.com" "unsubscribe" older_than:2d'
+        assert query.check_negations == [rule.conditions[1]]
+
+    def test_search_paginates_without_fetching_bodies(self, service) -> None:
+        engine = GmailSearchEngine(service=service)
+        rule = Rule(
+            "any", [{**RECEIVED_OLDER_THAN_2_DAYS, "predicate": "greater_than"}]
+        )
+        assert search_ids(engine, rule) == ["1", "4"]
+        assert engine.last_query.q == "newer_than:2d"
+        assert [method for method, _ in service.calls] == ["messages.list"]
+
+    def test_any_rule_and_negation(self, service) -> None:
+        engine = GmailSearchEngine(service=service)
+        rule = Rule(
+            "any",
+            [
+                condition("from", "contains", "linkedin"),
+                RECEIVED_OLDER_THAN_2_DAYS,
+                condition("subject", "not_contains", "meetup"),
+            ],
+        )
+        assert engine.translate(rule).q == ""
+        assert search_ids(engine, rule) == ["1", "2"]
+
+    def test_header_substrings_are_matched_in_memory(self, service) -> None:
+        engine = GmailSearchEngine(service=service)
+        # Gmail would not find "ample" or "velop", they are not whole words
+        rule = Rule("all", [condition("from", "contains", "ample.com")])
+        assert engine.translate(rule).q == ""
+        assert search_ids(engine, rule) == ["3", "4"]
+        rule = Rule(
+            "all",
+            [
+                condition("subject", "contains", "velop"),
+                condition("from", "not_contains", "ample"),
+            ],
+        )
+        assert search_ids(engine, rule) == ["1", "2"]
+
+    def test_negated_message_conditions_are_rejected(self, service) -> None:
+        engine = GmailSearchEngine(service=service)
+        for predicate, value in [
+            ("not_contains", "unsubscribe"),
+            ("not_contains_any", ["unsubscribe", "opt out"]),
+        ]:
+            rule = Rule("all", [condition("message", predicate, value)])
+            with pytest.raises(PushdownError, match=f"message {predicate}"):
+                engine.translate(rule)
+
+    def test_failed_metadata_fetch_is_reported(self, service) -> None:
+        service.failing_ids = {"3"}
+        engine = GmailSearchEngine(service=service)
+        rule = Rule("all", [condition("subject", "contains", "developer")])
+        with pytest.raises(SearchError, match="3: messages.get failed for 3"):
+            search_ids(engine, rule)
+
+    def test_inexact_conditions_are_post_filtered(self, service) -> None:
+        engine = GmailSearchEngine(service=service)
+        rule = Rule("all", [condition("subject", "equals", "developer")])
+        assert search_ids(engine, rule) == ["2"]
+        assert engine.last_query.q == 'subject:"developer"'
+        assert all(
+            kwargs["format"] == "metadata"
+            for method, kwargs in service.calls
+            if method == "messages.get"
+        )
+
+    def test_pattern_predicates(self, service) -> None:
+        engine = GmailSearchEngine(service=service)
+        keywords = Rule("all", [condition("from", "contains_any", ["news", "jobs"])])
+        assert search_ids(engine, keywords) == ["1", "2"]
+        body = Rule(
+            "all", [condition("message", "contains_any", ["opt out", "unsubscribe"])]
+        )
+        assert engine.translate(body).q == '{"opt out" "unsubscribe"}'
+        assert search_ids(engine, body) == ["4"]
+
+        regex = Rule(
+            "any",
+            [
+                condition("subject", "matches_regex", r"^developer( jobs)?$"),
+                condition("subject", "contains", "hello"),
+            ],
+        )
+        assert engine.translate(regex).q == ""
+        assert search_ids(engine, regex) == ["1", "2", "4"]
+
+    def test_metadata_conditions(self) -> None:
+        service = FakeGmailService(
+            messages={
+                "1": {**message("a@example.com", "big"), "size": 5000},
+                "2": {**message("b@example.com", "bigger"), "size": 9000},
+                "3": {**message("c@example.com", "new"), "size": 9000},
+            }
+        )
+        service.messages["3"]["labels"] = ["UNREAD", "INBOX"]
+        engine = GmailSearchEngine(service=service)
+        not_unread = condition("labels", "not_contains", "unread")
+
+        def size_rule(predicate: str, value: int) -> Rule:
+            size = {"field": "size", "predicate": predicate, "value": value}
+            return Rule("all", [{**size, "type": "number"}, not_unread])
+
+        assert engine.translate(size_rule("greater_than", 4000)).q == (
+            "larger:4000 -is:unread"
+        )
+        assert search_ids(engine, size_rule("greater_than", 4000)) == ["1", "2"]
+        assert search_ids(engine, size_rule("equals", 9000)) == ["2"]
+
+        attachments = {"field": "attachments", "predicate": "greater_than"}
+        rule = Rule("all", [{**attachments, "value": 2, "type": "number"}])
+        with pytest.raises(PushdownError, match="attachments greater_than"):
+            engine.translate(rule)
+
+    def test_unsupported_conditions_are_reported(self, service) -> None:
+        rule = Rule("all", [condition("message", "equals", "hello")])
+        with pytest.raises(PushdownError, match="message equals"):
+            search_ids(GmailSearchEngine(service=service), rule)
+
+    def test_match_ignores_negation(self, service) -> None:
+        engine = GmailSearchEngine(service=service)
+        rule = Rule("all", [condition("from", "not_equals", "jobs@linkedin.com")])
+        assert engine.match(rule.conditions[0]) == {"1"}
+        assert engine.all() == {"1", "2", "3", "4"}
@@ -0,0 +1,114 @@
+from core.models import Email
+from core.processor import Process
+from core.processor.optimizer import QueryOptimizer
+from core.processor.plan import ExecutionPlan
+from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.tests.conftest import create_email, search_ids
+
+
+def process(
+    rule_type: str,
+    conditions: list,
+    actions: list | None = None,
+    scope: str = "message",
+) -> Process:
+    return Process().add(
+        {
+            "rule": {"type": rule_type, "conditions": conditions, "scope": scope},
+            "actions": actions or [{"type": "mark_as_read"}],
+        }
+    )
+
+
+FROM_LINKEDIN = {
+    "field": "from",
+    "predicate": "contains",
+    "value": "linkedin",
+    "type": "string",
+}
+NOT_FROM_LINKEDIN = {**FROM_LINKEDIN, "predicate": "not_contains", "value": "LinkedIn"}
+SUBJECT_DEVELOPER = {
+    "field": "subject",
+    "predicate": "contains",
+    "value": "developer",
+    "type": "string",
+}
+RECEIVED = {
+    "field": "received",
+    "predicate": "less_than",
+    "value": "2",
+    "filter": "days",
+    "type": "datetime",
+}
+
+
+def flatten(chunks) -> list[str]:
+    return sorted(msg_id for chunk in chunks for msg_id in chunk)
+
+
+class CountingSearchEngine(DBSearchEngine):
+    def __init__(self) -> None:
+        super().__init__(Email)
+        self.calls = 0
+
+    def match(self, condition):
+        self.calls += 1
+        return super().match(condition)
+
+
+class TestQueryOptimizer:
+    def test_results_match_per_rule_search(self, emails) -> None:
+        processes = [
+            process("all", [FROM_LINKEDIN, SUBJECT_DEVELOPER]),
+            process("any", [SUBJECT_DEVELOPER, RECEIVED]),
+            process("all", [NOT_FROM_LINKEDIN]),
+            process("any", [FROM_LINKEDIN, NOT_FROM_LINKEDIN, RECEIVED]),
+        ]
+        engine = DBSearchEngine(Email)
+        optimizer = QueryOptimizer(engine)
+        for item, msg_ids in optimizer.run(ExecutionPlan.compile(processes, engine)):
+            assert flatten(msg_ids) == sorted(search_ids(engine, item.rule))
+
+    def test_shared_conditions_are_evaluated_once(self, emails) -> None:
+        processes = [
+            process("all", [FROM_LINKEDIN, SUBJECT_DEVELOPER, RECEIVED]),
+            process("all", [RECEIVED, SUBJECT_DEVELOPER, FROM_LINKEDIN]),
+            process("any", [FROM_LINKEDIN, RECEIVED]),
+            process("all", [NOT_FROM_LINKEDIN]),
+        ]
+        engine = CountingSearchEngine()
+        optimizer = QueryOptimizer(engine)
+        results = list(optimizer.run(ExecutionPlan.compile(processes, engine)))
+
+        assert len(results) == 3
+        assert engine.calls == 3
+        assert optimizer.report.collapsed_rules == 1
+        assert optimizer.report.evaluations_saved == 9 - 3
+
+    def test_only_equivalent_conditions_are_shared(self, emails) -> None:
+        create_email("5", "someone@example.com", "hellojobs")
+        jobs = {**SUBJECT_DEVELOPER, "value": "jobs"}
+        processes = [
+            process("all", [jobs]),
+            process("all", [{**jobs, "value": " jobs"}]),
+            process("all", [{**jobs, "value": "JOBS"}]),
+        ]
+        engine = DBSearchEngine(Email)
+        optimizer = QueryOptimizer(engine)
+        results = list(optimizer.run(ExecutionPlan.compile(processes, engine)))
+
+        assert optimizer.report.collapsed_rules == 1
+        assert [flatten(msg_ids) for _, msg_ids in results] == [["1", "5"], ["1"]]
+
+    def test_unshared_rules_are_streamed(self, emails) -> None:
+        processes = [
+            process("all", [FROM_LINKEDIN, RECEIVED]),
+            process("any", [SUBJECT_DEVELOPER]),
+        ]
+        engine = CountingSearchEngine()
+        optimizer = QueryOptimizer(engine)
+        results = list(optimizer.run(ExecutionPlan.compile(processes, engine)))
+
+        assert engine.calls == 0
+        assert optimizer.report.streamed_rules == 2
+        assert flatten(results[1][1]) == ["1", "3"]
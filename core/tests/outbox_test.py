@@ -0,0 +1,278 @@
+import time
+from datetime import timedelta
+
+import httplib2
+import pytest
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from core.models import Email, OutboxEntry
+from core.processor.plan import ExecutionPlan
+from core.processor.process_executor.gmail_executor import GmailProcessExecutor
+from core.processor.process_executor.outbox import OutboxDrainer, enqueue
+from core.tests.conftest import create_email
+from core.tests.fake_gmail import FakeGmailService
+from core.tests.optimizer_test import FROM_LINKEDIN, process
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    def test_drain_sends_in_batches_and_records_outcome(self) -> None:
+        enqueue([str(i) for i in range(5)], ["INBOX"], ["UNREAD"])
+        service = FakeGmailService(failing_ids={"3"})
+
+        report = OutboxDrainer(service, batch_size=2).drain()
+
+        assert (report.sent, report.failed) == (4, 1)
+        assert service.batches == [2, 2, 1]
+        assert service.calls[0] == (
+            "messages.modify",
+            {
+                "userId": "me",
+                "id": "0",
+                "body": {"addLabelIds": ["INBOX"], "removeLabelIds": ["UNREAD"]},
+            },
+        )
+        failed = OutboxEntry.objects.get(msg_id="3")
+        assert failed.status == OutboxEntry.Status.FAILED
+        assert "failed for 3" in failed.error
+
+    def test_unfinished_entries_are_deduplicated(self) -> None:
+        enqueue(["1", "2"], ["INBOX"], [])
+        enqueue(["2", "3"], ["INBOX"], [])
+        assert OutboxEntry.objects.count() == 3
+        OutboxDrainer(FakeGmailService()).drain()
+
+        # a rerun, e.g. after a crash, does not send applied changes again
+        enqueue(["1", "4"], ["INBOX"], [])
+        service = FakeGmailService()
+        OutboxDrainer(service).drain()
+
+        assert [kwargs["id"] for _, kwargs in service.calls] == ["4"]
+        assert OutboxEntry.objects.count() == 4
+
+    def test_changes_applied_long_ago_are_sent_again(self) -> None:
+        enqueue(["1", "2"], ["INBOX"], [])
+        OutboxDrainer(FakeGmailService()).drain()
+        OutboxEntry.objects.filter(msg_id="1").update(
+            updated_at=timezone.now() - timedelta(hours=2)
+        )
+
+        enqueue(["1", "2"], ["INBOX"], [], done_within=timedelta(hours=1))
+        enqueue(["2"], ["INBOX", "STARRED"], [])
+        service = FakeGmailService()
+        OutboxDrainer(service).drain()
+
+        assert [kwargs["id"] for _, kwargs in service.calls] == ["1", "2"]
+
+    def test_claimed_entries_are_not_sent_twice(self) -> None:
+        enqueue(["1", "2", "3"], ["INBOX"], [])
+        other = OutboxDrainer(FakeGmailService())
+        other._claim(list(OutboxEntry.objects.filter(msg_id__in=["1", "2"])))
+
+        service = FakeGmailService()
+        OutboxDrainer(service).drain()
+
+        assert [kwargs["id"] for _, kwargs in service.calls] == ["3"]
+        assert (
+            OutboxEntry.objects.filter(status=OutboxEntry.Status.IN_FLIGHT).count() == 2
+        )
+
+    def test_stale_claims_are_sent_again(self) -> None:
+        enqueue(["1", "2"], ["INBOX"], [])
+        crashed = OutboxDrainer(FakeGmailService())
+        crashed._claim(list(OutboxEntry.objects.filter(msg_id="1")))
+        OutboxEntry.objects.filter(msg_id="1").update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+
+        service = FakeGmailService()
+        report = OutboxDrainer(service).drain()
+
+        assert [kwargs["id"] for _, kwargs in service.calls] == ["1", "2"]
+        assert report.sent == 2
+
+    def test_failed_entries_planned_again_are_sent_once(self) -> None:
+        enqueue(["1"], ["INBOX"], [])
+        OutboxDrainer(FakeGmailService(failing_ids={"1"})).drain()
+        enqueue(["1"], ["INBOX"], [])
+        drainer = OutboxDrainer(FakeGmailService(failing_ids={"1"}))
+        drainer.drain()
+        enqueue(["1"], ["INBOX"], [])
+        drainer.drain()
+        assert OutboxEntry.objects.filter(status=OutboxEntry.Status.FAILED).count() == 2
+
+        service = FakeGmailService()
+        OutboxDrainer(service).drain()
+
+        assert [kwargs["id"] for _, kwargs in service.calls] == ["1"]
+        assert list(OutboxEntry.objects.values_list("status", flat=True)) == [
+            OutboxEntry.Status.DONE
+        ]
+
+    def test_resume_retries_pending_and_failed_entries(self) -> None:
+        enqueue(["1", "2"], [], ["UNREAD"])
+        OutboxDrainer(FakeGmailService(failing_ids={"2"}), max_attempts=2).drain()
+        enqueue(["3"], [], ["UNREAD"])
+
+        service = FakeGmailService(failing_ids={"2"})
+        OutboxDrainer(service, max_attempts=2).drain()
+        OutboxDrainer(FakeGmailService(), max_attempts=2).drain()
+
+        assert [kwargs["id"] for _, kwargs in service.calls] == ["3"]
+        assert OutboxEntry.objects.get(msg_id="2").attempts == 2
+        assert OutboxEntry.objects.get(msg_id="2").status == OutboxEntry.Status.FAILED
+
+    def test_parallel_drain_keeps_outbox_order(self) -> None:
+        msg_ids = [str(i) for i in range(40)]
+        enqueue(msg_ids, ["INBOX"], [])
+        services = []
+
+        def service_factory():
+            services.append(FakeGmailService(failing_ids={"7", "31"}, latency=0.05))
+            return services[-1]
+
+        start = time.perf_counter()
+        report = OutboxDrainer(
+            None, batch_size=5, workers=4, service_factory=service_factory
+        ).drain()
+        elapsed = time.perf_counter() - start
+
+        # 8 batches of 50ms each take 400ms one after another
+        assert elapsed < 0.3
+        assert len(services) == 4
+        assert all(len(service.threads) == 1 for service in services)
+        assert sorted(
+            kwargs["id"] for service in services for _, kwargs in service.calls
+        ) == sorted(set(msg_ids) - {"7", "31"})
+        assert (report.sent, report.failed) == (38, 2)
+        assert list(report.errors) == ["7", "31"]
+        assert "failed for 31" in report.errors["31"]
+
+    def test_failed_batch_fails_its_entries(self) -> None:
+        enqueue(["1", "2", "3"], ["INBOX"], [])
+        service = FakeGmailService(batch_error=ConnectionError("connection reset"))
+
+        report = OutboxDrainer(service, batch_size=2, workers=2).drain()
+
+        assert (report.sent, report.failed) == (0, 3)
+        assert report.errors == dict.fromkeys(["1", "2", "3"], "connection reset")
+        assert OutboxEntry.objects.filter(status=OutboxEntry.Status.FAILED).count() == 3
+
+    def test_rate_limited_entries_are_retried(self) -> None:
+        enqueue(["1", "2", "3"], ["INBOX"], [])
+        service = FakeGmailService(
+            transient_errors={
+                "1": [http_error(429), http_error(503)],
+                "2": [http_error(400)],
+                "3": [http_error(403, "User Rate Limit Exceeded")],
+            }
+        )
+
+        report = OutboxDrainer(service, backoff=0.01).drain()
+
+        # only the rate limited entries are sent again, "2" fails at once
+        assert service.batches == [3, 2, 1]
+        assert (report.sent, report.failed) == (2, 1)
+        assert list(report.errors) == ["2"]
+
+    def test_retries_are_bounded(self) -> None:
+        enqueue(["1"], ["INBOX"], [])
+        service = FakeGmailService(transient_errors={"1": [http_error(429)] * 3})
+
+        report = OutboxDrainer(service, retries=2, backoff=0.01).drain()
+
+        assert service.batches == [1, 1, 1]
+        assert report.failed == 1
+        assert OutboxEntry.objects.get(msg_id="1").status == OutboxEntry.Status.FAILED
+
+
+def http_error(status: int, reason: str = "") -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), reason.encode())
+
+
+class FakeExecutor(GmailProcessExecutor):
+    def __init__(self, service: FakeGmailService) -> None:
+        self._service = service
+
+    def _drainer(self) -> OutboxDrainer:
+        return OutboxDrainer(self._service, batch_size=2)
+
+
+@pytest.mark.django_db
+class TestStreamingExecutor:
+    def test_batches_are_sent_while_chunks_arrive(self) -> None:
+        service = FakeGmailService()
+        actions = (
+            ExecutionPlan.compile([process("all", [FROM_LINKEDIN])])
+            .processes[0]
+            .actions
+        )
+
+        def chunks():
+            yield ["1", "2", "3"]
+            assert service.batches == [2]
+            yield ["4"]
+            assert service.batches == [2, 2]
+            yield ["5"]
+
+        report = FakeExecutor(service).execute(actions, chunks())
+        assert service.batches == [2, 2, 1]
+        assert report.sent == 5
+
+    def execute(self, msg_ids: list[list[str]], scope: str = "message"):
+        service = FakeGmailService()
+        actions = (
+            ExecutionPlan.compile([process("all", [FROM_LINKEDIN], scope=scope)])
+            .processes[0]
+            .actions
+        )
+        report = FakeExecutor(service).execute(actions, msg_ids)
+        calls = sorted((method, kwargs["id"]) for method, kwargs in service.calls)
+        return calls, report
+
+    def test_message_scope_modifies_matched_messages(self, emails) -> None:
+        Email.objects.filter(msg_id__in=["1", "2"]).update(thread_id="t1")
+
+        calls, report = self.execute([["1", "2", "3"]])
+
+        assert calls == [
+            ("messages.modify", "1"),
+            ("messages.modify", "2"),
+            ("messages.modify", "3"),
+        ]
+        assert (report.sent, report.calls_saved) == (3, 0)
+
+    def test_thread_scope_modifies_whole_threads(self, emails) -> None:
+        Email.objects.filter(msg_id__in=["1", "4"]).update(thread_id="t1")
+        Email.objects.filter(msg_id="3").update(thread_id="t3")
+        create_email("5", "someone@example.com", thread_id="t1")
+
+        # "2" has no thread, t1 is matched again by the second chunk
+        calls, report = self.execute([["1", "2", "3"], ["1"]], scope="thread")
+
+        assert calls == [
+            ("messages.modify", "2"),
+            ("threads.modify", "t1"),
+            ("threads.modify", "t3"),
+        ]
+        assert (report.sent, report.calls_saved) == (3, 2)
+
+    def test_thread_scope_does_not_hold_back_matches(self, db) -> None:
+        for i in range(30):
+            create_email(str(i), "list@example.com", thread_id=f"t{i % 3}")
+        service = FakeGmailService()
+        actions = (
+            ExecutionPlan.compile([process("all", [FROM_LINKEDIN], scope="thread")])
+            .processes[0]
+            .actions
+        )
+
+        def chunks():
+            yield ["0", "1", "3"]
+            assert service.batches == [2]
+            yield ["2"]
+
+        report = FakeExecutor(service).execute(actions, chunks())
+        assert service.batches == [2, 1]
+        assert report.sent == 3
@@ -0,0 +1,74 @@
+import pytest
+
+from core.models import Email
+from core.processor import Process
+from core.processor.condition import ConditionType
+from core.processor.exception import ActionError, ConditionError, ConditionTypeError
+from core.processor.plan import ExecutionPlan
+from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.tests.conftest import search_ids
+from core.tests.optimizer_test import FROM_LINKEDIN, RECEIVED, process
+
+
+class TestExecutionPlan:
+    def test_actions_are_scoped_to_their_rule(self) -> None:
+        plan = ExecutionPlan.compile(
+            [
+                process("all", [FROM_LINKEDIN], [{"type": "mark_as_read"}]),
+                process(
+                    "all",
+                    [RECEIVED],
+                    [
+                        {"type": "move_message", "value": "inbox"},
+                        {"type": "move_message", "value": "inbox"},
+                    ],
+                ),
+            ]
+        )
+        first, second = plan.processes
+        assert first.actions.labels_to_add == ()
+        assert first.actions.labels_to_remove == ("UNREAD",)
+        assert second.actions.labels_to_add == ("INBOX",)
+        assert second.actions.labels_to_remove == ()
+
+    def test_plan_is_immutable(self) -> None:
+        plan = ExecutionPlan.compile([process("all", [RECEIVED])])
+        condition = plan.processes[0].rule.conditions[0]
+        assert condition.type is ConditionType.DATETIME
+        assert condition.value == 2
+        with pytest.raises(AttributeError):
+            condition.value = 3
+        with pytest.raises(AttributeError):
+            condition.extra = 1
+
+    def test_fragments_are_shared_and_used_by_search(self, emails) -> None:
+        engine = DBSearchEngine(Email)
+        plan = ExecutionPlan.compile(
+            [process("all", [FROM_LINKEDIN]), process("any", [FROM_LINKEDIN])],
+            engine,
+        )
+        first, second = (item.rule.conditions[0] for item in plan)
+        assert first.fragment is second.fragment
+        assert sorted(search_ids(engine, plan.processes[0].rule)) == ["1", "2", "3"]
+
+    @pytest.mark.parametrize(
+        "rule, error",
+        [
+            ({**FROM_LINKEDIN, "type": "boolean"}, ConditionTypeError),
+            ({**FROM_LINKEDIN, "type": "number"}, ConditionError),
+            ({**RECEIVED, "value": "soon"}, ConditionError),
+            ({**RECEIVED, "filter": None}, ConditionError),
+        ],
+    )
+    def test_invalid_conditions_are_rejected(self, rule, error) -> None:
+        with pytest.raises(error):
+            process("all", [rule])
+
+    def test_move_message_requires_value(self) -> None:
+        with pytest.raises(ActionError):
+            Process().add(
+                {
+                    "rule": {"type": "all", "conditions": [FROM_LINKEDIN]},
+                    "actions": [{"type": "move_message"}],
+                }
+            )
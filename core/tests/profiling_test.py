@@ -0,0 +1,58 @@
+import time
+
+from core.profiling import Profiler, profiled, stage, timed
+
+
+def allocate(size: int) -> int:
+    with stage("allocate"):
+        return len(bytearray(size))
+
+
+class TestProfiler:
+    def test_stages_are_no_ops_without_a_profiler(self) -> None:
+        with stage("idle"):
+            pass
+        assert list(timed("idle", [1, 2])) == [1, 2]
+
+    def test_records_calls_time_and_peak_memory(self) -> None:
+        with Profiler() as profiler:
+            with stage("outer"):
+                time.sleep(0.01)
+                allocate(4 * 2**20)
+            allocate(2**20)
+
+        outer, inner = profiler.stats["outer"], profiler.stats["allocate"]
+        assert (outer.calls, inner.calls) == (1, 2)
+        assert outer.wall >= 0.01
+        assert outer.cpu < outer.wall
+        # the nested peak also counts for the enclosing stage; objects freed
+        # while a stage runs lower its peak by a few bytes
+        assert outer.peak_memory >= 4 * 2**20 - 2**16
+        assert inner.peak_memory >= 4 * 2**20 - 2**16
+        assert profiler.report()["stages"]["allocate"]["calls"] == 2
+        assert profiler.table().splitlines()[1].startswith("outer")
+
+    def test_timed_counts_each_item(self) -> None:
+        with Profiler(trace_memory=False) as profiler:
+            assert list(timed("search", iter([[1], [2], [3]]))) == [[1], [2], [3]]
+        assert profiler.stats["search"].calls == 4
+
+    def test_worker_stats_are_merged(self) -> None:
+        result, stats = profiled(True, allocate, 1024)
+        assert result == 1024
+        assert profiled(False, allocate, 1024) == (1024, None)
+
+        with Profiler(trace_memory=False) as profiler:
+            profiler.merge(stats)
+            profiler.merge(stats)
+        assert profiler.stats["allocate"].calls == 2
+
+    def test_dumps_cprofile_stats_per_stage(self, tmp_path) -> None:
+        with Profiler(trace_memory=False, dump_dir=str(tmp_path)):
+            with stage("outer"):
+                allocate(1024)
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "allocate.prof",
+            "outer.prof",
+        ]
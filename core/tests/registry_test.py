@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+from core.processor.exception import BackendError
+from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.registry import get_backend
+
+
+class TestRegistry:
+    def test_resolves_default_and_dotted_backends(self) -> None:
+        assert get_backend("search_engine") is DBSearchEngine
+        dotted = "core.processor.search_engine.db_search_engine.DBSearchEngine"
+        assert get_backend("search_engine", dotted) is DBSearchEngine
+
+    def test_unknown_backend(self) -> None:
+        with pytest.raises(BackendError):
+            get_backend("executor", "missing")
+
+    def test_commands_do_not_import_google_client(self) -> None:
+        code = (
+            "import os, sys, django;"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'email_op.settings');"
+            "django.setup();"
+            "import email_op.urls, core.management.commands.process;"
+            "import loader.management.commands.load;"
+            "print(any(m.startswith('googleapiclient') for m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "False"
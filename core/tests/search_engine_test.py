@@ -0,0 +1,254 @@
+import pytest
+
+from core.address import parse_sender, registrable_domain
+from core.metadata import label_bits
+from core.models import Email, Recipient
+from core.processor.exception import ConditionError
+from core.processor.matching import matches
+from core.processor.patterns import (
+    KeywordMatcher,
+    minimal_keywords,
+    required_literals,
+)
+from core.processor.rule import Rule
+from core.processor.search_engine.db_search_engine import DBSearchEngine
+from core.tests.conftest import create_email, search_ids
+
+
+def from_rule(
+    predicate: str, value: str | list, rule_type: str = "all", field: str = "from"
+) -> Rule:
+    return Rule(
+        rule_type,
+        [{"field": field, "predicate": predicate, "value": value, "type": "string"}],
+    )
+
+
+class TestParseSender:
+    def test_parse_display_name_and_address(self) -> None:
+        assert parse_sender("LinkedIn <Jobs-NoReply@Mail.LinkedIn.com>") == (
+            "LinkedIn",
+            "jobs-noreply@mail.linkedin.com",
+            "linkedin.com",
+        )
+
+    def test_parse_missing_header(self) -> None:
+        assert parse_sender(None) == ("", "", "")
+
+    def test_registrable_domain_multi_label_suffix(self) -> None:
+        assert registrable_domain("mail.example.co.uk") == "example.co.uk"
+
+
+class TestSenderLookups:
+    def search(self, rule: Rule) -> set:
+        return set(search_ids(DBSearchEngine(Email), rule))
+
+    def test_contains_keyword_keeps_substring_semantics(self, emails) -> None:
+        assert self.search(from_rule("contains", "linkedin")) == {"1", "2", "3"}
+
+    def test_address_uses_sender_address(self, emails) -> None:
+        rule = from_rule("equals", "Jobs-NoReply@linkedin.com")
+        assert self.search(rule) == {"1"}
+
+    def test_domain_uses_sender_domain(self, emails) -> None:
+        assert self.search(from_rule("equals", "linkedin.com")) == {"1", "2"}
+        assert self.search(from_rule("not_equals", "@linkedin.com")) == {"3", "4"}
+
+    def test_contains_is_never_rewritten(self, emails) -> None:
+        assert self.search(from_rule("contains", "@linkedin.com")) == {"1"}
+        assert self.search(from_rule("not_contains", "linkedin.com")) == {"3", "4"}
+        assert self.search(from_rule("contains", "news@")) == {"2"}
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            ("bob@x.com", {"5", "6"}),
+            ("ample.com", {"4", "7"}),
+            ("x.co", {"5", "6", "8"}),
+            ("jobs@", {"9"}),
+        ],
+    )
+    def test_contains_matches_substrings_of_the_header(
+        self, emails, value, expected
+    ) -> None:
+        create_email("5", "Jim <jimbob@x.com>")
+        create_email("6", "bob@x.com via Foo <relay@other.com>")
+        create_email("7", "user@example.com")
+        create_email("8", "a@x.com")
+        create_email("9", "myjobs@corp.com")
+        rule = from_rule("contains", value)
+        assert self.search(rule) == expected
+        condition = rule.conditions[0]
+        assert {
+            email["msg_id"]
+            for email in Email.objects.values()
+            if matches(condition, email)
+        } == expected
+
+    @pytest.mark.parametrize(
+        "predicate, value",
+        [("contains", "bob@x.com"), ("contains", "x.com"), ("equals", "linkedin")],
+    )
+    def test_other_values_fall_back_to_icontains(self, predicate, value) -> None:
+        condition = from_rule(predicate, value).conditions[0]
+        assert DBSearchEngine(Email).build_sender_query(condition) is None
+
+
+class TestPatternPredicates:
+    def search(self, rule: Rule) -> set:
+        db_ids = set(search_ids(DBSearchEngine(Email), rule))
+        # the in memory match used by post-filters must agree with the database
+        condition = rule.conditions[0]
+        memory_ids = {
+            email["msg_id"]
+            for email in Email.objects.values()
+            if matches(condition, email) != condition.is_negated
+        }
+        assert db_ids == memory_ids
+        return db_ids
+
+    def test_contains_any_sender_keywords_match_substrings(self, emails) -> None:
+        keywords = ["Jobs-NoReply@linkedin.com", "example.co", "someone"]
+        assert self.search(from_rule("contains_any", keywords)) == {"1", "3", "4"}
+        assert self.search(from_rule("contains_any", ["news@"])) == {"2"}
+
+    def test_contains_any_subject(self, emails) -> None:
+        rule = from_rule("contains_any", ["Digest", "meetup", "dev"], field="subject")
+        assert self.search(rule) == {"1", "2", "3"}
+        rule = from_rule("not_contains_any", ["digest", "jobs"], field="subject")
+        assert self.search(rule) == {"3", "4"}
+
+    def test_contains_any_is_one_regex_pass(self, emails) -> None:
+        engine = DBSearchEngine(Email)
+        rule = from_rule("contains_any", ["Digest", "jobs"], field="subject")
+        query = str(engine.build_query(rule.conditions[0]))
+        assert "('subject__iregex', 'digest|jobs')" in query
+        assert "('subject__icontains', 'jobs')" in query
+        assert self.search(rule) == {"1", "2"}
+
+        # keywords are literal text, and many of them skip the LIKE prefilter
+        keywords = ["dev.lopers", *(f"keyword{i}" for i in range(10)), "hello"]
+        rule = from_rule("contains_any", keywords, field="subject")
+        query = str(engine.build_query(rule.conditions[0]))
+        assert query.count("iregex") == 1 and "icontains" not in query
+        assert self.search(rule) == {"4"}
+
+    def test_matches_regex_is_prefiltered_by_literals(self, emails) -> None:
+        rule = from_rule("matches_regex", r"^dev\w+ (jobs|roles)$", field="subject")
+        query = str(DBSearchEngine(Email).build_query(rule.conditions[0]))
+        assert "('subject__icontains', 'dev')" in query
+        assert self.search(rule) == {"1"}
+        assert self.search(from_rule("not_matches_regex", r"linkedin\.com")) == {
+            "3",
+            "4",
+        }
+
+    def test_invalid_pattern_values_are_rejected(self) -> None:
+        with pytest.raises(ConditionError, match="regex"):
+            from_rule("matches_regex", "(unclosed")
+        with pytest.raises(ConditionError, match="keywords"):
+            from_rule("contains_any", "linkedin")
+
+    @pytest.mark.parametrize(
+        "pattern, literals",
+        [
+            (r"linkedin\.com", [("linkedin.com",)]),
+            (r"(jobs|careers)@example", [("@example",)]),
+            (r"foo.*bar(baz)+quux?", [("foo", "bar", "baz", "quu")]),
+            (r"news|digest", [("news",), ("digest",)]),
+            (r"ab|digest", None),
+        ],
+    )
+    def test_required_literals(self, pattern, literals) -> None:
+        assert required_literals(pattern) == literals
+
+    def test_keywords_containing_others_are_dropped(self) -> None:
+        assert minimal_keywords(["developer", "dev", "jobs"]) == ("dev", "jobs")
+
+    def test_keyword_matcher_automaton(self) -> None:
+        pytest.importorskip("ahocorasick")
+        matcher = KeywordMatcher(["Digest", "dev", "c++"])
+        assert matcher._automaton is not None
+        texts = ["Weekly DIGEST", "developer", "learn c++", "c+", "hello", ""]
+        found = [matcher.search(text) for text in texts]
+        assert found == [True, True, True, False, False, False]
+        # the fallback must agree with the automaton
+        matcher._automaton = None
+        assert [matcher.search(text) for text in texts] == found
+
+
+class TestMetadataConditions:
+    @pytest.fixture
+    def metadata(self, emails) -> None:
+        Email.objects.filter(msg_id="1").update(
+            size_estimate=12_000,
+            attachment_count=2,
+            attachment_bytes=10_000,
+            to_addresses="me@example.com,team@example.com",
+            label_bits=label_bits(["INBOX", "UNREAD"]),
+        )
+        Email.objects.filter(msg_id="2").update(
+            size_estimate=3_000,
+            cc_addresses="me@example.com",
+            label_bits=label_bits(["INBOX"]),
+        )
+        Recipient.objects.store(Email.objects.all())
+
+    def search(self, field: str, predicate: str, value, type: str) -> set:
+        condition = {"field": field, "predicate": predicate, "value": value}
+        rule = Rule("all", [{**condition, "type": type}])
+        engine = DBSearchEngine(Email)
+        sql = str(engine.queryset(rule).query)
+        assert '"message"' not in sql.split("WHERE")[1]
+        db_ids = set(search_ids(engine, rule))
+        condition = rule.conditions[0]
+        memory_ids = {
+            email["msg_id"]
+            for email in Email.objects.values()
+            if matches(condition, email) != condition.is_negated
+        }
+        assert db_ids == memory_ids
+        return db_ids
+
+    def test_number_conditions(self, metadata) -> None:
+        assert self.search("size", "greater_than", 5000, "number") == {"1"}
+        assert self.search("attachments", "equals", 0, "number") == {"2", "3", "4"}
+        assert self.search("attachment_size", "less_than", "1", "number") == {
+            "2",
+            "3",
+            "4",
+        }
+        assert self.search("attachments", "not_equals", 0, "number") == {"1"}
+
+    def test_label_conditions(self, metadata) -> None:
+        assert self.search("labels", "contains", "unread", "string") == {"1"}
+        assert self.search("labels", "not_contains", "INBOX", "string") == {"3", "4"}
+
+    def test_recipient_conditions(self, metadata) -> None:
+        assert self.search("to", "equals", "Team@example.com", "string") == {"1"}
+        assert self.search("to", "equals", "team@example", "string") == set()
+        assert self.search("to", "not_equals", "me@example.com", "string") == {
+            "2",
+            "3",
+            "4",
+        }
+        assert self.search("cc", "equals", "me@example.com", "string") == {"2"}
+        assert self.search("cc", "contains", "me@", "string") == {"2"}
+        rule = from_rule("equals", "me@x.com", field="to")
+        where = str(DBSearchEngine(Email).queryset(rule).query).split("WHERE")[1]
+        assert "core_recipient" in where and "to_addresses" not in where
+
+    @pytest.mark.parametrize(
+        "field, predicate, value, type",
+        [
+            ("size", "contains", 1, "number"),
+            ("size", "greater_than", -1, "number"),
+            ("subject", "equals", 1, "number"),
+            ("labels", "contains", "Label_42", "string"),
+            ("labels", "equals", "INBOX", "string"),
+        ],
+    )
+    def test_invalid_metadata_conditions(self, field, predicate, value, type) -> None:
+        condition = {"field": field, "predicate": predicate, "value": value}
+        with pytest.raises(ConditionError):
+            Rule("all", [{**condition, "type": type}])
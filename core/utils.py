@@ -0,0 +1,8 @@
+import itertools
+from typing import Iterable, Iterator
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
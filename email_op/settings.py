@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -91,6 +92,53 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "search": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": env(
+            "SEARCH_CACHE_DIR", str(Path(tempfile.gettempdir()) / "email_op_cache")
+        ),
+    },
+}
+
+# Search results are kept in a per-process LRU keyed by rule fingerprint, data
+# version and time bucket. The data version lives in the "search" cache so
+# loader runs in other processes invalidate it; set SHARE_RESULTS to also store
+# results there for multi-worker deployments.
+SEARCH_CACHE = {
+    "SIZE": env("SEARCH_CACHE_SIZE", 256),
+    "TIME_BUCKET": env("SEARCH_CACHE_TIME_BUCKET", 60),
+    "ALIAS": "search",
+    "SHARE_RESULTS": env("SEARCH_CACHE_SHARE_RESULTS", 0) == 1,
+    "MAX_RESULT_SIZE": env("SEARCH_CACHE_MAX_RESULT_SIZE", 100_000),
+}
+
+# Search engines, executors and loaders are imported lazily through
+# core.registry. Values are a built in name, a dotted path or the name of an
+# "email_op.<kind>" entry point.
+EMAIL_OP_BACKENDS = {
+    "search_engine": env("SEARCH_ENGINE_BACKEND", "db"),
+    "executor": env("EXECUTOR_BACKEND", "gmail"),
+    "loader": env("LOADER_BACKEND", "gmail"),
+}
+
+# Outbox batches are sent by WORKERS threads at once, each with its own HTTP
+# connection. BATCH_SIZE is capped at Gmail's limit of 100 requests per batch.
+# Changes applied in the last DONE_WITHIN_MINUTES are not sent again, so a
+# crashed run can be started over.
+GMAIL_EXECUTOR = {
+    "WORKERS": env("GMAIL_EXECUTOR_WORKERS", 4),
+    "BATCH_SIZE": env("GMAIL_EXECUTOR_BATCH_SIZE", 50),
+    "DONE_WITHIN_MINUTES": env("GMAIL_EXECUTOR_DONE_WITHIN_MINUTES", 60),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
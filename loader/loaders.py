@@ -1,18 +1,24 @@
 import base64
+import itertools
+import mmap
+import os
 import os.path
-from typing import Protocol
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional, Protocol
 
-from dateutil.parser import parse
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from django.db import transaction
 
-from core.models import Email
+from core import profiling
+from core.models import Email, Recipient
+from core.processor.search_engine.cache import bump_data_version
+from core.utils import chunked
+from loader.parsing import normalize_email, parse_raw_emails
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
-MULTIPART_MIME_TYPES = ["multipart/alternative", "multipart/mixed", "multipart/related"]
+TEXT_MIME_TYPES = ["text/plain", "text/html"]
+FILE_FORMATS = ["mbox", "maildir", "eml"]
 
 
 class Loader(Protocol):
@@ -23,11 +29,15 @@ class GmailLoader:
     def __init__(self) -> None:
         self.email_data = []
         self._creds = None
-        self._authenticate()
+        with profiling.stage("auth"):
+            self._authenticate()
 
     def load_data(self, limit: int = 10):
         self._fetch_emails(limit)
-        Email.objects.bulk_create(self._prepare_data_for_db())
+        with profiling.stage("bulk_create"), transaction.atomic():
+            emails = Email.objects.bulk_create(self._prepare_data_for_db())
+            Recipient.objects.store(emails)
+        bump_data_version()
 
     def _prepare_data_for_db(self):
         for data in self.email_data:
@@ -38,10 +48,15 @@ class GmailLoader:
             print("request_id: {}, exception: {}".format(request_id, str(exception)))
             pass
         else:
-            email_data = self._process_data(response)
+            with profiling.stage("decode"):
+                email_data = self._process_data(response)
             self.email_data.append(email_data)
 
     def _authenticate(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
         if os.path.exists("token.json"):
             self._creds = Credentials.from_authorized_user_file("token.json", SCOPES)
         if not self._creds or not self._creds.valid:
@@ -55,58 +70,158 @@ class GmailLoader:
             with open("token.json", "w") as token:
                 token.write(self._creds.to_json())
 
-    def _extract_body_from_multipart(self, payload: dict) -> str:
-        for part in payload["parts"]:
-            if part["mimeType"] == "text/html" or part["mimeType"] == "text/plain":
-                body = base64.urlsafe_b64decode(part["body"]["data"]).decode()
-                return body
-            else:
-                return ""
-
-        return ""
+    @staticmethod
+    def _walk_parts(payload: dict) -> Iterator[dict]:
+        yield payload
+        for part in payload.get("parts", []):
+            yield from GmailLoader._walk_parts(part)
 
     def _process_data(self, payload: dict):
         msg_id = payload["id"]
-        subject = None
-        from_email = None
-        received_at = ""
-        body = None
-        headers = payload["payload"]["headers"]
-        for header in headers:
-            if header["name"] == "Subject":
-                subject = header["value"]
-            elif header["name"] == "From":
-                from_email = header["value"]
-            elif header["name"] == "Date":
-                received_at = header["value"]
-        mimetype = payload["payload"]["mimeType"]
-        if mimetype in MULTIPART_MIME_TYPES:
-            body = self._extract_body_from_multipart(payload["payload"])
-        else:
-            body = payload["payload"]["body"]["data"]
-            body = base64.urlsafe_b64decode(body).decode()
-
-        return {
-            "msg_id": msg_id,
-            "subject": subject,
-            "from_email": from_email,
-            "received_at": parse(received_at),
-            "message": body,
+        headers = {
+            header["name"].lower(): header["value"]
+            for header in payload["payload"]["headers"]
         }
+        # one pass over the MIME tree; attachments are only counted, their
+        # data is fetched separately by Gmail and never downloaded here
+        body = None
+        attachment_count = attachment_bytes = 0
+        for part in self._walk_parts(payload["payload"]):
+            part_body = part.get("body", {})
+            if part.get("filename") or "attachmentId" in part_body:
+                attachment_count += 1
+                attachment_bytes += part_body.get("size", 0)
+            elif body is None and part.get("mimeType") in TEXT_MIME_TYPES:
+                if "data" in part_body:
+                    body = base64.urlsafe_b64decode(part_body["data"]).decode()
+
+        return normalize_email(
+            msg_id,
+            headers.get("subject"),
+            headers.get("from"),
+            headers.get("date", ""),
+            body or "",
+            payload.get("threadId", ""),
+            to=headers.get("to"),
+            cc=headers.get("cc"),
+            size_estimate=payload.get("sizeEstimate", 0),
+            attachment_count=attachment_count,
+            attachment_bytes=attachment_bytes,
+            label_ids=payload.get("labelIds", []),
+        )
 
     def _fetch_emails(self, limit: int):
+        from googleapiclient.discovery import build
+        from googleapiclient.errors import HttpError
+
         try:
             service = build("gmail", "v1", credentials=self._creds)
 
-            messages_result = (
-                service.users().messages().list(userId="me", maxResults=limit).execute()
-            )
+            with profiling.stage("list"):
+                messages_result = (
+                    service.users()
+                    .messages()
+                    .list(userId="me", maxResults=limit)
+                    .execute()
+                )
             messages = messages_result.get("messages", [])
             bt = service.new_batch_http_request(callback=self._callback)
             for msg in messages:
                 msg = service.users().messages().get(userId="me", id=msg["id"])
                 bt.add(msg)
-            bt.execute()
+            with profiling.stage("fetch"):
+                bt.execute()
 
         except HttpError as error:
             print(f"An error occurred: {error}")
+
+
+class FileLoader:
+    def __init__(
+        self,
+        path: str,
+        format: Optional[str] = None,
+        chunk_size: int = 500,
+        workers: Optional[int] = None,
+    ) -> None:
+        self._path = Path(path)
+        if not self._path.exists():
+            raise FileNotFoundError(path)
+        self._format = format or self._detect_format()
+        if self._format not in FILE_FORMATS:
+            raise ValueError(f"unsupported format {self._format}")
+        self._chunk_size = chunk_size
+        self._workers = workers or os.cpu_count() or 1
+        self.loaded = 0
+        self.skipped = 0
+
+    def load_data(self, limit: Optional[int] = None) -> int:
+        raw_messages = itertools.islice(self._iter_raw_messages(), limit)
+        unescape_from = self._format == "mbox"
+        profile = profiling.active() is not None
+        with ProcessPoolExecutor(max_workers=self._workers) as pool:
+            pending: deque[tuple[int, Future]] = deque()
+            for chunk in chunked(raw_messages, self._chunk_size):
+                future = pool.submit(
+                    profiling.profiled, profile, parse_raw_emails, chunk, unescape_from
+                )
+                pending.append((len(chunk), future))
+                if len(pending) >= self._workers * 2:
+                    self._write(*pending.popleft())
+            while pending:
+                self._write(*pending.popleft())
+        return self.loaded
+
+    def _write(self, size: int, future: Future):
+        emails, stats = future.result()
+        profiler = profiling.active()
+        if stats and profiler is not None:
+            profiler.merge(stats)
+        with profiling.stage("bulk_create"), transaction.atomic():
+            created = Email.objects.bulk_create(Email(**data) for data in emails)
+            Recipient.objects.store(created)
+        bump_data_version()
+        self.loaded += len(emails)
+        self.skipped += size - len(emails)
+
+    def _detect_format(self) -> str:
+        if self._path.is_file():
+            return "eml" if self._path.suffix == ".eml" else "mbox"
+        if (self._path / "cur").is_dir() or (self._path / "new").is_dir():
+            return "maildir"
+        return "eml"
+
+    def _iter_raw_messages(self) -> Iterator[bytes]:
+        if self._format == "mbox":
+            yield from self._iter_mbox()
+        elif self._format == "maildir":
+            for folder in ("cur", "new"):
+                for path in sorted((self._path / folder).glob("*")):
+                    if path.is_file():
+                        yield path.read_bytes()
+        elif self._path.is_file():
+            yield self._path.read_bytes()
+        else:
+            for path in sorted(self._path.rglob("*.eml")):
+                yield path.read_bytes()
+
+    def _iter_mbox(self) -> Iterator[bytes]:
+        with open(self._path, "rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[:5] == b"From ":
+                    start = 0
+                else:
+                    start = mm.find(b"\nFrom ") + 1
+                    if start == 0:
+                        return
+                while start < size:
+                    body_start = mm.find(b"\n", start) + 1
+                    if body_start == 0:
+                        return
+                    end = mm.find(b"\nFrom ", body_start)
+                    stop = size if end == -1 else end + 1
+                    yield mm[body_start:stop]
+                    start = stop
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Email
+from core.profiling import add_profile_arguments, profile_command
+from loader.snapshot import SnapshotWriter
+
+
+class Command(BaseCommand):
+    help = "Export stored email to a columnar snapshot directory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Snapshot directory to write")
+        parser.add_argument("--chunk-size", type=int, default=50_000)
+        parser.add_argument(
+            "--level", type=int, default=6, choices=range(10), help="zlib level"
+        )
+        add_profile_arguments(parser)
+
+    def handle(self, *args, **options):
+        with profile_command(options, self.stdout):
+            writer = SnapshotWriter(
+                Email,
+                options["path"],
+                chunk_size=options["chunk_size"],
+                level=options["level"],
+            )
+            writer.write()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Exported {writer.rows} emails to {options['path']}"
+                )
+            )
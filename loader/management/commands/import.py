@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Email, Recipient
+from core.processor.search_engine.cache import bump_data_version
+from core.profiling import add_profile_arguments, profile_command
+from loader.snapshot import SnapshotError, SnapshotImporter, SnapshotReader
+
+
+class Command(BaseCommand):
+    help = "Import email from a snapshot directory written by export"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Snapshot directory to read")
+        parser.add_argument(
+            "--replace", action="store_true", help="Delete stored email first"
+        )
+        add_profile_arguments(parser)
+
+    def handle(self, *args, **options):
+        with profile_command(options, self.stdout):
+            try:
+                importer = SnapshotImporter(Email, SnapshotReader(options["path"]))
+            except FileNotFoundError:
+                self.stdout.write(
+                    self.style.ERROR(f"Snapshot {options['path']} does not exist")
+                )
+                return
+            except SnapshotError as error:
+                self.stdout.write(self.style.ERROR(str(error)))
+                return
+            last_id = Email.objects.order_by("-pk").values_list("pk", flat=True).first()
+            importer.load(replace=options["replace"])
+            # snapshots hold the address lists, the recipient rows are derived
+            Recipient.objects.rebuild(Email.objects.filter(pk__gt=last_id or 0))
+            bump_data_version()
+            self.stdout.write(self.style.SUCCESS(f"Imported {importer.rows} emails"))
@@ -1,13 +1,49 @@
 from django.core.management.base import BaseCommand
 
-from loader.loaders import GmailLoader
+from core.profiling import add_profile_arguments, profile_command
+from core.registry import get_backend
+from loader.loaders import FILE_FORMATS
 
 
 class Command(BaseCommand):
     help = "Load email data to database"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            type=str,
+            help="Load from an mbox file, Maildir or directory of .eml files",
+        )
+        parser.add_argument("--format", choices=FILE_FORMATS)
+        parser.add_argument("--limit", type=int)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--workers", type=int)
+        add_profile_arguments(parser)
+
     def handle(self, *args, **options):
+        with profile_command(options, self.stdout):
+            self._load(options)
+
+    def _load(self, options):
         self.stdout.write(self.style.HTTP_INFO("Starting loading process"))
-        gmail_loader = GmailLoader()
-        gmail_loader.load_data(10)
+        if options["source"]:
+            try:
+                file_loader = get_backend("loader", "file")(
+                    options["source"],
+                    format=options["format"],
+                    chunk_size=options["chunk_size"],
+                    workers=options["workers"],
+                )
+            except FileNotFoundError:
+                self.stdout.write(
+                    self.style.ERROR(f"Source {options['source']} does not exist")
+                )
+                return
+            file_loader.load_data(options["limit"])
+            self.stdout.write(
+                f"Loaded {file_loader.loaded} emails, skipped {file_loader.skipped}"
+            )
+        else:
+            email_loader = get_backend("loader")()
+            email_loader.load_data(options["limit"] or 10)
         self.stdout.write(self.style.SUCCESS("Loading process successfully completed"))
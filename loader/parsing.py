@@ -0,0 +1,102 @@
+import hashlib
+import re
+from email import message_from_bytes, policy
+from typing import Iterable, Optional
+
+from core.address import parse_sender
+from core.metadata import address_list, label_bits, takeout_label_ids
+from core.profiling import stage
+
+MBOXRD_FROM_PATTERN = re.compile(rb"(?m)^>(>*From )")
+
+
+def normalize_email(
+    msg_id: str,
+    subject: str,
+    from_email: str,
+    received_at: str,
+    body: str,
+    thread_id: str = "",
+    to: Optional[str] = None,
+    cc: Optional[str] = None,
+    size_estimate: int = 0,
+    attachment_count: int = 0,
+    attachment_bytes: int = 0,
+    label_ids: Iterable[str] = (),
+) -> dict:
+    from dateutil.parser import parse
+
+    sender_name, sender_address, sender_domain = parse_sender(from_email)
+    with stage("parse_date"):
+        received_at = parse(received_at)
+    return {
+        "msg_id": msg_id,
+        "thread_id": thread_id,
+        "subject": subject,
+        "from_email": from_email,
+        "sender_name": sender_name,
+        "sender_address": sender_address,
+        "sender_domain": sender_domain,
+        "received_at": received_at,
+        "message": body,
+        "to_addresses": address_list(to),
+        "cc_addresses": address_list(cc),
+        "size_estimate": size_estimate,
+        "attachment_count": attachment_count,
+        "attachment_bytes": attachment_bytes,
+        "label_bits": label_bits(label_ids),
+    }
+
+
+def message_id_for(message_id: Optional[str], raw: bytes) -> str:
+    digest = hashlib.sha1(message_id.encode() if message_id else raw)
+    return digest.hexdigest()[:16]
+
+
+def thread_id_for(gmail_thread_id: Optional[str]) -> str:
+    # Gmail exports carry the decimal X-GM-THRID, the API uses it in hex
+    try:
+        return format(int(str(gmail_thread_id)), "x")
+    except ValueError:
+        return ""
+
+
+def parse_raw_email(raw: bytes, unescape_from: bool = False) -> Optional[dict]:
+    if unescape_from:
+        raw = MBOXRD_FROM_PATTERN.sub(rb"\1", raw)
+    try:
+        with stage("decode"):
+            message = message_from_bytes(raw, policy=policy.default)
+            part = message.get_body(preferencelist=("plain", "html"))
+            body = part.get_content() if part is not None else ""
+            attachments = [
+                len(attachment.get_payload(decode=True) or b"")
+                for attachment in message.walk()
+                if not attachment.is_multipart()
+                and (attachment.is_attachment() or attachment.get_filename())
+            ]
+        return normalize_email(
+            message_id_for(message.get("Message-ID"), raw),
+            str(message.get("Subject", "")),
+            str(message.get("From", "")),
+            str(message.get("Date", "")),
+            body,
+            thread_id_for(message.get("X-GM-THRID")),
+            to=str(message.get("To", "")),
+            cc=str(message.get("Cc", "")),
+            size_estimate=len(raw),
+            attachment_count=len(attachments),
+            attachment_bytes=sum(attachments),
+            label_ids=takeout_label_ids(message.get("X-Gmail-Labels")),
+        )
+    except (LookupError, ValueError, OverflowError):
+        return None
+
+
+def parse_raw_emails(raws: list[bytes], unescape_from: bool = False) -> list[dict]:
+    emails = []
+    for raw in raws:
+        data = parse_raw_email(raw, unescape_from)
+        if data is not None:
+            emails.append(data)
+    return emails
@@ -0,0 +1,298 @@
+"""Columnar snapshots of the Email table.
+
+A snapshot is a directory holding ``manifest.json`` and ``columns.bin``. Rows
+are cut into chunks and every column of a chunk is written as one zlib
+compressed block; the manifest lists the columns, and for every chunk its row
+count and the offset, length and crc32 of each block.
+
+Column encodings, all little endian:
+    str       uint32 utf-8 byte length per row, then the concatenated bytes
+    int       int64 per row
+    datetime  int64 microseconds since the epoch, UTC
+"""
+
+import json
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from django.db import connection, models, transaction
+
+from core.profiling import stage
+from core.utils import chunked
+
+SNAPSHOT_FORMAT = "email_op.snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+DATA_NAME = "columns.bin"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def column_type(field: models.Field) -> str:
+    internal_type = field.get_internal_type()
+    if internal_type == "DateTimeField":
+        return "datetime"
+    if internal_type.endswith("IntegerField"):
+        return "int"
+    return "str"
+
+
+def snapshot_fields(model: type[models.Model]) -> list[models.Field]:
+    # primary keys are assigned by the target database
+    return [field for field in model._meta.concrete_fields if not field.primary_key]
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_column(kind: str, values: list) -> bytes:
+    if kind == "str":
+        encoded = [value.encode() for value in values]
+        lengths = _little_endian(array("I", map(len, encoded)))
+        return lengths.tobytes() + b"".join(encoded)
+    if kind == "datetime":
+        values = [(value - EPOCH) // MICROSECOND for value in values]
+    return _little_endian(array("q", values)).tobytes()
+
+
+def decode_column(kind: str, data: bytes, rows: int) -> list:
+    if kind == "str":
+        lengths = array("I")
+        lengths.frombytes(data[: rows * lengths.itemsize])
+        _little_endian(lengths)
+        values, position = [], rows * lengths.itemsize
+        for length in lengths:
+            values.append(data[position : position + length].decode())
+            position += length
+        return values
+    numbers = array("q")
+    numbers.frombytes(data)
+    numbers = _little_endian(numbers).tolist()
+    if kind == "datetime":
+        return [EPOCH + number * MICROSECOND for number in numbers]
+    return numbers
+
+
+class SnapshotWriter:
+    def __init__(
+        self,
+        model: type[models.Model],
+        path: str,
+        chunk_size: int = 50_000,
+        level: int = 6,
+    ) -> None:
+        self._model = model
+        self._path = Path(path)
+        self._chunk_size = chunk_size
+        self._level = level
+        self._fields = snapshot_fields(model)
+        self.rows = 0
+
+    def write(self, queryset: Optional[models.QuerySet] = None) -> dict:
+        queryset = self._model.objects.all() if queryset is None else queryset
+        names = [field.attname for field in self._fields]
+        kinds = [column_type(field) for field in self._fields]
+        rows = (
+            queryset.order_by("pk")
+            .values_list(*names)
+            .iterator(chunk_size=self._chunk_size)
+        )
+
+        self._path.mkdir(parents=True, exist_ok=True)
+        chunks = []
+        offset = 0
+        with open(self._path / DATA_NAME, "wb") as fp:
+            for chunk in chunked(rows, self._chunk_size):
+                blocks = {}
+                for name, kind, values in zip(names, kinds, zip(*chunk)):
+                    with stage("encode"):
+                        block = zlib.compress(
+                            encode_column(kind, list(values)), self._level
+                        )
+                    fp.write(block)
+                    blocks[name] = {
+                        "offset": offset,
+                        "length": len(block),
+                        "crc32": zlib.crc32(block),
+                    }
+                    offset += len(block)
+                chunks.append({"rows": len(chunk), "columns": blocks})
+                self.rows += len(chunk)
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "model": self._model._meta.label,
+            "compression": "zlib",
+            "rows": self.rows,
+            "columns": [
+                {"name": name, "type": kind} for name, kind in zip(names, kinds)
+            ],
+            "chunks": chunks,
+        }
+        with open(self._path / MANIFEST_NAME, "w") as fp:
+            json.dump(manifest, fp, indent=2)
+        return manifest
+
+
+class SnapshotReader:
+    def __init__(self, path: str) -> None:
+        self._path = Path(path)
+        try:
+            with open(self._path / MANIFEST_NAME) as fp:
+                self.manifest = json.load(fp)
+        except ValueError as error:
+            raise SnapshotError(f"unreadable manifest: {error}") from error
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"{path} is not an email_op snapshot")
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(
+                f"unsupported snapshot version {self.manifest.get('version')}"
+            )
+        self.columns = [column["name"] for column in self.manifest["columns"]]
+
+    def __iter__(self) -> Iterator[list[tuple]]:
+        kinds = [column["type"] for column in self.manifest["columns"]]
+        with open(self._path / DATA_NAME, "rb") as fp:
+            for chunk in self.manifest["chunks"]:
+                columns = []
+                for name, kind in zip(self.columns, kinds):
+                    block = chunk["columns"][name]
+                    fp.seek(block["offset"])
+                    data = fp.read(block["length"])
+                    if zlib.crc32(data) != block["crc32"]:
+                        raise SnapshotError(f"corrupt block for column {name}")
+                    with stage("decode"):
+                        columns.append(
+                            decode_column(kind, zlib.decompress(data), chunk["rows"])
+                        )
+                yield list(zip(*columns))
+
+
+class SnapshotImporter:
+    """Insert snapshot rows with raw ``executemany`` calls.
+
+    Secondary indexes of the model are dropped first and created again once
+    every row is in, so the database builds each of them in one pass. Index
+    changes run in their own schema editor, sqlite can not alter the schema
+    inside a transaction, so ``load`` must not be called in one.
+    """
+
+    def __init__(self, model: type[models.Model], reader: SnapshotReader) -> None:
+        if reader.manifest["model"] != model._meta.label:
+            raise SnapshotError(
+                f"snapshot holds {reader.manifest['model']}, not {model._meta.label}"
+            )
+        self._model = model
+        self._reader = reader
+        by_attname = {field.attname: field for field in snapshot_fields(model)}
+        missing = set(reader.columns) - set(by_attname)
+        if missing:
+            raise SnapshotError(f"unknown columns {', '.join(sorted(missing))}")
+        self._fields = [by_attname[name] for name in reader.columns]
+        # columns added after the snapshot was written get their default
+        self._defaults = [
+            field for name, field in by_attname.items() if name not in reader.columns
+        ]
+        undefaulted = [
+            field.attname
+            for field in self._defaults
+            if not field.has_default() and not field.null
+        ]
+        if undefaulted:
+            raise SnapshotError(f"missing columns {', '.join(undefaulted)}")
+        self.rows = 0
+
+    def load(self, replace: bool = False) -> int:
+        table = connection.ops.quote_name(self._model._meta.db_table)
+        fields = self._fields + self._defaults
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+
+        indexes = self._indexes()
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(self._model, index)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if replace:
+                    self._delete_all(cursor)
+                for rows in self._reader:
+                    rows = self._prepare(rows)
+                    with stage("insert"):
+                        cursor.executemany(sql, rows)
+                    self.rows += len(rows)
+        finally:
+            with stage("index"), connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(self._model, index)
+        return self.rows
+
+    def _delete_all(self, cursor: Any) -> None:
+        # QuerySet.delete() selects every row to cascade to related rows,
+        # rows referencing the model are deleted before it instead
+        tables = [
+            relation.related_model._meta.db_table
+            for relation in self._model._meta.related_objects
+            if relation.on_delete is models.CASCADE
+        ]
+        for table in tables + [self._model._meta.db_table]:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(table)}")
+
+    def _prepare(self, rows: list[tuple]) -> list[tuple]:
+        adapters = [self._adapter(field) for field in self._fields]
+        defaults = tuple(self._default(field) for field in self._defaults)
+        return [
+            tuple(
+                adapter(value) if adapter else value
+                for adapter, value in zip(adapters, row)
+            )
+            + defaults
+            for row in rows
+        ]
+
+    @staticmethod
+    def _adapter(field: models.Field) -> Any:
+        if column_type(field) == "datetime":
+            return connection.ops.adapt_datetimefield_value
+        return None
+
+    @classmethod
+    def _default(cls, field: models.Field) -> Any:
+        value, adapter = field.get_default(), cls._adapter(field)
+        return adapter(value) if adapter else value
+
+    def _indexes(self) -> list[models.Index]:
+        """Indexes declared on the model that exist in the database."""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, self._model._meta.db_table
+            )
+        indexes = [
+            index for index in self._model._meta.indexes if index.name in constraints
+        ]
+        # db_index fields get a generated name, found by their column
+        by_columns = {
+            tuple(constraint["columns"]): name
+            for name, constraint in constraints.items()
+            if constraint["index"]
+            and not constraint["unique"]
+            and not constraint["primary_key"]
+        }
+        for field in self._model._meta.local_concrete_fields:
+            name = by_columns.get((field.column,))
+            if field.db_index and not field.unique and name is not None:
+                indexes.append(models.Index(fields=[field.name], name=name))
+        return indexes
@@ -0,0 +1,115 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from core.models import Email
+from loader.loaders import FileLoader
+
+MESSAGE = """From: {sender}
+To: me@example.com
+Subject: {subject}
+Date: Mon, 17 Jun 2024 10:00:00 +0000
+Message-ID: <{msg_id}@example.com>
+X-GM-THRID: 1802345678901234567
+
+Hello
+>From the team
+"""
+
+
+def message(msg_id: str, subject: str, sender: str = "Jobs <jobs@linkedin.com>"):
+    return MESSAGE.format(msg_id=msg_id, subject=subject, sender=sender)
+
+
+@pytest.mark.django_db
+class TestFileLoader:
+    def test_load_mbox(self, tmp_path) -> None:
+        mbox = tmp_path / "inbox.mbox"
+        mbox.write_text(
+            "".join(
+                f"From MAILER-DAEMON Mon Jun 17 10:00:00 2024\n{message(i, f'msg {i}')}\n"
+                for i in range(5)
+            )
+        )
+        loader = FileLoader(str(mbox), chunk_size=2, workers=2)
+        assert loader.load_data() == 5
+
+        email = Email.objects.get(subject="msg 3")
+        assert email.sender_domain == "linkedin.com"
+        assert email.message == "Hello\nFrom the team\n\n"
+        assert len(email.msg_id) == 16
+        assert email.thread_id == "190337d8815e4b87"
+
+    def test_load_maildir_and_eml(self, tmp_path) -> None:
+        (tmp_path / "maildir" / "cur").mkdir(parents=True)
+        (tmp_path / "maildir" / "new").mkdir()
+        (tmp_path / "maildir" / "new" / "1").write_text(message("a", "maildir"))
+        (tmp_path / "eml").mkdir()
+        (tmp_path / "eml" / "1.eml").write_text(message("b", "eml"))
+        (tmp_path / "eml" / "broken.eml").write_text("Subject: no date\n\nbody")
+
+        assert FileLoader(str(tmp_path / "maildir"), workers=1).load_data() == 1
+        eml_loader = FileLoader(str(tmp_path / "eml"), workers=1)
+        assert eml_loader.load_data() == 1
+        assert eml_loader.skipped == 1
+        assert set(Email.objects.values_list("subject", flat=True)) == {
+            "maildir",
+            "eml",
+        }
+
+    def test_load_metadata(self, tmp_path) -> None:
+        (tmp_path / "1.eml").write_text("""From: Jobs <jobs@linkedin.com>
+To: me@example.com
+Cc: Team <team@example.com>
+Subject: with attachment
+Date: Mon, 17 Jun 2024 10:00:00 +0000
+X-Gmail-Labels: Inbox,Unread,Category Updates,Job hunt
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="b"
+
+--b
+Content-Type: text/plain
+
+Hello
+--b
+Content-Type: application/octet-stream
+Content-Disposition: attachment; filename="cv.txt"
+Content-Transfer-Encoding: base64
+
+aGVsbG8gd29ybGQ=
+--b--
+""")
+        FileLoader(str(tmp_path), workers=1).load_data()
+
+        email = Email.objects.get()
+        assert email.message == "Hello"
+        assert (email.to_addresses, email.cc_addresses) == (
+            "me@example.com",
+            "team@example.com",
+        )
+        assert sorted(email.recipients.values_list("kind", "address")) == [
+            ("cc", "team@example.com"),
+            ("to", "me@example.com"),
+        ]
+        assert (email.attachment_count, email.attachment_bytes) == (1, 11)
+        assert email.size_estimate > 0
+        assert email.label_bits == 0b11 | 1 << 11
+
+    def test_load_command_profiles_stages(self, tmp_path) -> None:
+        (tmp_path / "1.eml").write_text(message("a", "one"))
+        (tmp_path / "2.eml").write_text(message("b", "two"))
+        stdout = StringIO()
+
+        call_command(
+            "load", source=str(tmp_path), workers=1, profile="json", stdout=stdout
+        )
+
+        output = stdout.getvalue()
+        report = json.loads(output[output.index("{") :])
+        stages = report["stages"]
+        assert stages["decode"]["calls"] == 2
+        assert stages["parse_date"]["calls"] == 2
+        assert stages["bulk_create"]["calls"] == 1
+        assert stages["decode"]["peak_memory"] > 0
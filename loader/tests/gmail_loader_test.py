@@ -0,0 +1,72 @@
+import base64
+
+from loader.loaders import GmailLoader
+
+
+class OfflineGmailLoader(GmailLoader):
+    def __init__(self) -> None:
+        self.email_data = []
+
+
+def encoded(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+PAYLOAD = {
+    "id": "18f0",
+    "threadId": "18e0",
+    "sizeEstimate": 734_512,
+    "labelIds": ["INBOX", "UNREAD", "Label_7"],
+    "payload": {
+        "mimeType": "multipart/mixed",
+        "headers": [
+            {"name": "From", "value": "LinkedIn <jobs@linkedin.com>"},
+            {"name": "To", "value": "Me <Me@Example.com>, team@example.com"},
+            {"name": "Cc", "value": "boss@example.com"},
+            {"name": "Subject", "value": "Offer"},
+            {"name": "Date", "value": "Mon, 17 Jun 2024 10:00:00 +0000"},
+        ],
+        "body": {"size": 0},
+        "parts": [
+            {
+                "mimeType": "multipart/alternative",
+                "body": {"size": 0},
+                "parts": [
+                    {
+                        "mimeType": "text/plain",
+                        "filename": "",
+                        "body": {"size": 5, "data": encoded("Hello")},
+                    },
+                    {
+                        "mimeType": "text/html",
+                        "filename": "",
+                        "body": {"size": 12, "data": encoded("<b>Hello</b>")},
+                    },
+                ],
+            },
+            {
+                "mimeType": "application/pdf",
+                "filename": "offer.pdf",
+                "body": {"size": 700_000, "attachmentId": "ANGjdJ8"},
+            },
+            {
+                "mimeType": "image/png",
+                "filename": "logo.png",
+                "body": {"size": 20_000, "attachmentId": "ANGjdJ9"},
+            },
+        ],
+    },
+}
+
+
+class TestGmailLoader:
+    def test_process_data_walks_the_mime_tree(self) -> None:
+        email = OfflineGmailLoader()._process_data(PAYLOAD)
+
+        assert email["message"] == "Hello"
+        assert email["thread_id"] == "18e0"
+        assert email["to_addresses"] == "me@example.com,team@example.com"
+        assert email["cc_addresses"] == "boss@example.com"
+        assert email["size_estimate"] == 734_512
+        assert (email["attachment_count"], email["attachment_bytes"]) == (2, 720_000)
+        assert email["label_bits"] == 0b11
@@ -0,0 +1,170 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Email, Recipient
+from core.tests.conftest import create_email
+from loader.snapshot import (
+    MANIFEST_NAME,
+    SnapshotError,
+    SnapshotImporter,
+    SnapshotReader,
+    SnapshotWriter,
+)
+
+FIELDS = [
+    "msg_id",
+    "thread_id",
+    "from_email",
+    "sender_domain",
+    "subject",
+    "received_at",
+]
+
+
+def stored_emails() -> list[tuple]:
+    return list(Email.objects.order_by("msg_id").values_list(*FIELDS))
+
+
+def index_names() -> set[str]:
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, Email._meta.db_table
+        )
+    return {name for name, constraint in constraints.items() if constraint["index"]}
+
+
+def corrupt_block(path, column: str) -> None:
+    manifest_path = path / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    manifest["chunks"][0]["columns"][column]["crc32"] += 1
+    manifest_path.write_text(json.dumps(manifest))
+
+
+def drop_columns(path, names: list[str]) -> None:
+    # snapshots written before these columns existed
+    manifest_path = path / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    manifest["columns"] = [
+        column for column in manifest["columns"] if column["name"] not in names
+    ]
+    for chunk in manifest["chunks"]:
+        for name in names:
+            del chunk["columns"][name]
+    manifest_path.write_text(json.dumps(manifest))
+
+
+@pytest.mark.django_db(transaction=True)
+class TestSnapshot:
+    def test_round_trip_in_chunks(self, tmp_path) -> None:
+        create_email("1", "Zoë <zoe@example.de>", "Grüße 🎉", thread_id="t1")
+        create_email("2", "LinkedIn <jobs@linkedin.com>", "developer", days_ago=3)
+        create_email("3", "LinkedIn <news@linkedin.com>", "")
+        expected = stored_emails()
+
+        manifest = SnapshotWriter(Email, str(tmp_path), chunk_size=2).write()
+        assert manifest["rows"] == 3
+        assert [chunk["rows"] for chunk in manifest["chunks"]] == [2, 1]
+
+        indexes = index_names()
+        Email.objects.all().delete()
+        importer = SnapshotImporter(Email, SnapshotReader(str(tmp_path)))
+
+        assert importer.load() == 3
+        assert stored_emails() == expected
+        assert index_names() == indexes
+
+    def test_import_command_replaces_stored_email(self, tmp_path) -> None:
+        create_email("1", "LinkedIn <jobs@linkedin.com>")
+        call_command("export", str(tmp_path), stdout=StringIO())
+        create_email("2", "LinkedIn <jobs@linkedin.com>")
+
+        stdout = StringIO()
+        call_command("import", str(tmp_path), replace=True, stdout=stdout)
+
+        assert "Imported 1 emails" in stdout.getvalue()
+        assert list(Email.objects.values_list("msg_id", flat=True)) == ["1"]
+
+    def test_replace_deletes_without_loading_rows(self, tmp_path) -> None:
+        create_email("1", "LinkedIn <jobs@linkedin.com>")
+        SnapshotWriter(Email, str(tmp_path)).write()
+        email = create_email("2", "LinkedIn <jobs@linkedin.com>")
+        Email.objects.filter(pk=email.pk).update(to_addresses="me@example.com")
+        Recipient.objects.store(Email.objects.filter(pk=email.pk))
+
+        importer = SnapshotImporter(Email, SnapshotReader(str(tmp_path)))
+        with CaptureQueriesContext(connection) as queries:
+            importer.load(replace=True)
+
+        tables = [Email._meta.db_table, Recipient._meta.db_table]
+        assert not [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and any(f'FROM "{table}"' in query["sql"] for table in tables)
+        ]
+        assert list(Email.objects.values_list("msg_id", flat=True)) == ["1"]
+        assert not Recipient.objects.exists()
+
+    def test_corrupt_blocks_are_rejected(self, tmp_path) -> None:
+        create_email("1", "LinkedIn <jobs@linkedin.com>")
+        SnapshotWriter(Email, str(tmp_path)).write()
+        corrupt_block(tmp_path, "subject")
+
+        with pytest.raises(SnapshotError, match="subject"):
+            list(SnapshotReader(str(tmp_path)))
+
+    def test_failed_import_restores_indexes(self, tmp_path) -> None:
+        create_email("1", "LinkedIn <jobs@linkedin.com>")
+        SnapshotWriter(Email, str(tmp_path)).write()
+        corrupt_block(tmp_path, "subject")
+        indexes = index_names()
+
+        importer = SnapshotImporter(Email, SnapshotReader(str(tmp_path)))
+        with pytest.raises(SnapshotError):
+            importer.load(replace=True)
+
+        assert index_names() == indexes
+        assert list(Email.objects.values_list("msg_id", flat=True)) == ["1"]
+
+    def test_missing_columns_get_their_default(self, tmp_path) -> None:
+        email = create_email("1", "LinkedIn <jobs@linkedin.com>")
+        Email.objects.filter(pk=email.pk).update(size_estimate=5000, label_bits=3)
+        SnapshotWriter(Email, str(tmp_path)).write()
+        drop_columns(tmp_path, ["size_estimate", "label_bits", "to_addresses"])
+
+        importer = SnapshotImporter(Email, SnapshotReader(str(tmp_path)))
+        assert importer.load(replace=True) == 1
+
+        assert Email.objects.values_list(
+            "msg_id", "size_estimate", "label_bits", "to_addresses"
+        ).get() == ("1", 0, 0, "")
+
+    def test_missing_columns_without_default_are_rejected(self, tmp_path) -> None:
+        create_email("1", "LinkedIn <jobs@linkedin.com>")
+        SnapshotWriter(Email, str(tmp_path)).write()
+        drop_columns(tmp_path, ["subject", "thread_id"])
+
+        with pytest.raises(SnapshotError, match="missing columns subject$"):
+            SnapshotImporter(Email, SnapshotReader(str(tmp_path)))
+
+    def test_import_command_rebuilds_recipients(self, tmp_path) -> None:
+        email = create_email("1", "LinkedIn <jobs@linkedin.com>")
+        Email.objects.filter(pk=email.pk).update(
+            to_addresses="me@example.com,team@example.com", cc_addresses="boss@x.com"
+        )
+        call_command("export", str(tmp_path), stdout=StringIO())
+
+        call_command("import", str(tmp_path), replace=True, stdout=StringIO())
+
+        assert sorted(
+            Recipient.objects.values_list("email__msg_id", "kind", "address")
+        ) == [
+            ("1", "cc", "boss@x.com"),
+            ("1", "to", "me@example.com"),
+            ("1", "to", "team@example.com"),
+        ]